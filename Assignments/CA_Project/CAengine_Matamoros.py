@@ -0,0 +1,226 @@
+# Cellular Automata Program 1 - Vectorized Engine
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module runs the same SLIR cellular automaton as `CAmain_Matamoros.py`, but instead of keeping every
+#       cell as a Python tuple, the grid is split into one typed NumPy array per tuple field. A whole day is then
+#       simulated with a handful of array operations instead of a Python loop over every cell.
+
+import numpy as np
+
+# cell states, matching index 'a' of the tuple schema in `CAmain_Matamoros.py`
+EMPTY = 0
+SUSCEPTIBLE = 1
+LATENT = 2
+INFECTIOUS = 3
+RECOVERED = 4
+
+# The grid is a dictionary of arrays, one per field of the (a, b, c, d, e) tuple:
+#       "state"           -> 'a', the location state (int8)
+#       "days_latent"     -> 'b', days spent in the latent stage (int16)
+#       "days_infectious" -> 'c', days spent in the infectious stage (int16)
+#       "exposure"        -> 'd', exposure points accumulated so far (float32)
+#       "id"              -> 'e', the individual's ID (int32)
+# Every array keeps the same one-cell border of zeros as the tuple grid, so neighbour lookups never go
+#       out of bounds and only the interior `[1:-1, 1:-1]` is ever updated.
+def new_grid(num_row, num_col):
+    shape = (num_row+2, num_col+2)
+    return {
+        "state": np.zeros(shape, dtype=np.int8),
+        "days_latent": np.zeros(shape, dtype=np.int16),
+        "days_infectious": np.zeros(shape, dtype=np.int16),
+        "exposure": np.zeros(shape, dtype=np.float32),
+        "id": np.zeros(shape, dtype=np.int32),
+    }
+
+# build an array grid from a grid of (a, b, c, d, e) tuples, like `SIM_MATRICES[0]`
+def from_object_grid(matrix):
+    grid = new_grid(matrix.shape[0]-2, matrix.shape[1]-2)
+    fields = np.array(matrix.tolist(), dtype=np.float64)
+    grid["state"][...] = fields[:, :, 0]
+    grid["days_latent"][...] = fields[:, :, 1]
+    grid["days_infectious"][...] = fields[:, :, 2]
+    grid["exposure"][...] = fields[:, :, 3]
+    grid["id"][...] = fields[:, :, 4]
+    return grid
+
+# build a grid of (a, b, c, d, e) tuples from an array grid, the reverse of `from_object_grid`
+def to_object_grid(grid):
+    matrix = np.empty(grid["state"].shape, dtype=object)
+    cells = matrix.ravel()
+    fields = [grid[name].ravel().tolist() for name in ("state", "days_latent", "days_infectious", "exposure", "id")]
+    for i, cell in enumerate(zip(*fields)):
+        cells[i] = cell
+    return matrix
+
+# pick `count` distinct cells out of `num_cells` (flat indices of the grid's interior, row by row), in a
+#       random order. Every cell is equally likely unless a `density` raster gives each interior cell a
+#       non-negative weight, in which case the cells are drawn one after another with probability
+#       proportional to their weight (the Efraimidis-Spirakis method: each cell gets the key log(u)/weight
+#       for a uniform random u, and the cells with the largest keys are drawn, largest first). Cells with
+#       no weight are never picked. Both ways take time linear in the number of cells, however full the grid.
+def choose_cells(rng, num_cells, count, density=None):
+    if density is None:
+        return rng.choice(num_cells, size=count, replace=False)
+    weights = np.asarray(density, dtype=np.float64).ravel()
+    if np.count_nonzero(weights > 0) < count:
+        raise ValueError("The population - "+str(count)+" - is greater than the number of cells the density map allows ("+str(np.count_nonzero(weights > 0))+").")
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = np.full(num_cells, -np.inf)
+    allowed = weights > 0
+    # 1 - random() is in (0, 1], so every allowed cell gets a finite key
+    keys[allowed] = np.log(1.0 - rng.random(num_cells)[allowed]) / weights[allowed]
+    chosen = np.argpartition(keys, num_cells-count)[num_cells-count:]
+    return chosen[np.argsort(-keys[chosen], kind="stable")]
+
+# place `num_infectious` infectious individuals (IDs 1 to `num_infectious`) and then `num_susceptible`
+#       susceptible individuals (the following IDs) on distinct cells of an empty grid, chosen by `choose_cells`
+def place(grid, rng, num_infectious, num_susceptible, density=None):
+    cells = band(grid, 0, grid["state"].shape[0]-2)
+    num_row, num_col = cells["state"].shape
+    chosen = choose_cells(rng, num_row*num_col, num_infectious+num_susceptible, density)
+    rows, cols = np.divmod(chosen, num_col)
+    cells["state"][rows, cols] = SUSCEPTIBLE
+    cells["state"][rows[:num_infectious], cols[:num_infectious]] = INFECTIOUS
+    cells["id"][rows, cols] = np.arange(1, len(chosen)+1)
+
+# count the number of infectious neighbours of every interior cell at once by adding up shifted slices
+#       of the infectious mask. The border of zeros means the slices never wrap around.
+def count_infectious_neighbors(state, von_neumann, out=None):
+    infectious = (state == INFECTIOUS).view(np.uint8)
+    if out is None:
+        out = np.empty((state.shape[0]-2, state.shape[1]-2), dtype=np.uint8)
+    # north, south, west, and east neighbours
+    np.add(infectious[:-2, 1:-1], infectious[2:, 1:-1], out=out)
+    out += infectious[1:-1, :-2]
+    out += infectious[1:-1, 2:]
+    # if using the Moore method, consider the corner neighbours
+    if not von_neumann:
+        out += infectious[:-2, :-2]
+        out += infectious[:-2, 2:]
+        out += infectious[2:, :-2]
+        out += infectious[2:, 2:]
+    return out
+
+# the interior cells of grid rows `start` to `stop` (counted without the border, like the tuple grid's
+#       `ITERATOR_LIMIT`), as views into the grid's arrays
+def band(grid, start, stop):
+    return {name: array[start+1:stop+1, 1:-1] for name, array in grid.items()}
+
+# count the infectious neighbours of the interior cells of grid rows `start` to `stop`. Only the band's rows
+#       and the one row above and below it (its halo) are read.
+def count_band_neighbors(grid, start, stop, von_neumann, out=None):
+    return count_infectious_neighbors(grid["state"][start:stop+2], von_neumann, out)
+
+# simulate one day on the whole grid. Every transition is decided from the grid as it was at the start of
+#       the day, exactly like the tuple version reading `SIM_MATRICES[0]` and writing `SIM_MATRICES[1]`.
+#       Returns how many people became latent, infectious, and recovered so the caller can keep its counters.
+def step(grid, params):
+    neighbors = count_infectious_neighbors(grid["state"], params["vonNeumann"])
+    return update(band(grid, 0, grid["state"].shape[0]-2), neighbors, params)
+
+# move the cells of a band (see `band`) through one day, given every cell's infectious neighbour count at
+#       the start of the day. The neighbour counts are overwritten.
+#       Returns how many people became latent, infectious, and recovered.
+def update(cells, neighbors, params):
+    state = cells["state"]
+    days_latent = cells["days_latent"]
+    days_infectious = cells["days_infectious"]
+    exposure = cells["exposure"]
+
+    susceptible = state == SUSCEPTIBLE
+    latent = state == LATENT
+    infectious = state == INFECTIOUS
+
+    # susceptible people add today's infectious neighbours to their exposure points, and become latent
+    #       once they reach the limit. Only susceptible people collect exposure points, so the neighbour
+    #       counts of everyone else are zeroed before adding.
+    np.multiply(neighbors, susceptible, out=neighbors)
+    exposure += neighbors
+    newly_latent = susceptible & (exposure >= params["max_exposure"])
+    # latent people either wait one more day or become infectious
+    newly_infectious = latent & (days_latent >= params["latent_period"])
+    # infectious people either wait one more day or recover
+    newly_recovered = infectious & (days_infectious >= params["infectious_period"])
+
+    # The updates below are written as multiplications and additions by masks rather than masked
+    #       assignments, because a masked assignment branches on every cell and is several times slower.
+    # bump the day counters, then reset the ones of people who just left their stage
+    days_latent += latent
+    days_latent *= ~newly_infectious
+    days_infectious += infectious
+    days_infectious *= ~newly_recovered
+    exposure *= ~newly_latent
+    # every transition (1 -> 2, 2 -> 3, 3 -> 4) moves a person to the next state code
+    state += newly_latent | newly_infectious | newly_recovered
+
+    return int(np.count_nonzero(newly_latent)), int(np.count_nonzero(newly_infectious)), int(np.count_nonzero(newly_recovered))
+
+##############################################################################################################
+#                                          ACTIVE-FRONTIER STEPPING
+##############################################################################################################
+
+# Empty, susceptible-with-no-infectious-neighbours, and recovered cells never change, so early and late in an
+#       outbreak almost every cell of a full sweep is wasted work. The functions below only visit the "active"
+#       cells: the latent and infectious people, plus the susceptible neighbours of the infectious ones. The
+#       active set is kept as two arrays of flat indices into the (bordered) grid arrays, and each day costs
+#       time in proportion to the number of active cells instead of the area of the grid.
+
+# flat-index offsets from a cell to its neighbours in a bordered grid `num_cols` wide (border included)
+def neighbor_offsets(num_cols, von_neumann):
+    offsets = [-num_cols, num_cols, -1, 1]
+    if not von_neumann:
+        offsets += [-num_cols-1, -num_cols+1, num_cols-1, num_cols+1]
+    return np.array(offsets, dtype=np.int64)
+
+# find the active cells of a grid. Returns {"latent": flat indices, "infectious": flat indices}.
+def active_set(grid):
+    state = grid["state"].ravel()
+    return {"latent": np.flatnonzero(state == LATENT), "infectious": np.flatnonzero(state == INFECTIOUS)}
+
+# simulate one day by visiting only the active cells, and update `active` for the next day. Gives exactly
+#       the same grid as `step`, and returns the same counts.
+def step_active(grid, active, params):
+    state = grid["state"].ravel()
+    days_latent = grid["days_latent"].ravel()
+    days_infectious = grid["days_infectious"].ravel()
+    exposure = grid["exposure"].ravel()
+    latent = active["latent"]
+    infectious = active["infectious"]
+
+    # every infectious person gives one exposure point to each of their susceptible neighbours. The border
+    #       of zeros means a neighbour index never falls outside the grid.
+    touched = (infectious[:, None] + neighbor_offsets(grid["state"].shape[1], params["vonNeumann"])).ravel()
+    touched = touched[state[touched] == SUSCEPTIBLE]
+    exposed, points = np.unique(touched, return_counts=True)
+    exposure[exposed] += points
+    if params["max_exposure"] <= 0:
+        # with no exposure needed at all, every susceptible person becomes latent, neighbours or not
+        exposed = np.flatnonzero(state == SUSCEPTIBLE)
+    newly_latent = exposed[exposure[exposed] >= params["max_exposure"]]
+
+    # latent people either wait one more day or become infectious
+    done = days_latent[latent] >= params["latent_period"]
+    newly_infectious = latent[done]
+    still_latent = latent[~done]
+    days_latent[still_latent] += 1
+    days_latent[newly_infectious] = 0
+
+    # infectious people either wait one more day or recover
+    done = days_infectious[infectious] >= params["infectious_period"]
+    newly_recovered = infectious[done]
+    still_infectious = infectious[~done]
+    days_infectious[still_infectious] += 1
+    days_infectious[newly_recovered] = 0
+
+    # every decision above was made from the grid as it was at the start of the day; now apply them
+    exposure[newly_latent] = 0
+    state[newly_latent] = LATENT
+    state[newly_infectious] = INFECTIOUS
+    state[newly_recovered] = RECOVERED
+    active["latent"] = np.concatenate((still_latent, newly_latent))
+    active["infectious"] = np.concatenate((still_infectious, newly_infectious))
+
+    return len(newly_latent), len(newly_infectious), len(newly_recovered)
@@ -1,7 +1,21 @@
 import json
+import numpy as np
 
 def load_params(infile):
     with open(infile,'r') as f:
         data = f.read()
         param = json.loads(data)
-    return param
\ No newline at end of file
+    return param
+
+# read a density map with one non-negative weight per grid cell: a `.npy` array, or a comma-separated
+#       text file with one line per grid row
+def load_density(infile, num_row, num_col):
+    if infile.endswith(".npy"):
+        density = np.load(infile)
+    else:
+        density = np.loadtxt(infile, delimiter=",", ndmin=2)
+    if density.shape != (num_row, num_col):
+        raise ValueError("The density map in "+infile+" is "+"x".join(str(size) for size in density.shape)+" but the grid is "+str(num_row)+"x"+str(num_col)+".")
+    if (density < 0).any() or not np.isfinite(density).all():
+        raise ValueError("The density map in "+infile+" must only hold non-negative numbers.")
+    return density
@@ -7,35 +7,30 @@
 #       Each day, a report will be generated and sent to an output file. The report will contain the locations of the
 #       individuals at the end of each day, as well as the number of infectious, latent, and recovered individuals.
 
-import random
+import os
 import sys
 import numpy as np
-from CAhelper_Matamoros import load_params
+from CAhelper_Matamoros import load_params, load_density
+import CAengine_Matamoros as engine
+import CAtiles_Matamoros as tiles
 
-##############################################################################################################
-#                                               CONSTANTS
-##############################################################################################################
+# the output layer shared with the graph model lives in `../SimTools`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "SimTools"))
+import SIMoutput_Matamoros as output
+import SIMtrace_Matamoros as trace
+import SIMframes_Matamoros as frames
+import SIMprofile_Matamoros as profiling
+import SIMcheckpoint_Matamoros as checkpoints
+import SIMrender_Matamoros as render
+
+# version of the simulation's behaviour. Saved results (see `../SimTools`) are only reused for the same
+#       version, so bump it whenever a change makes the same params and seed give different numbers.
+ENGINE_VERSION = "2"
+
+# the columns of the daily report
+REPORT_COLUMNS = ("day", "susceptible", "latent", "infectious", "recovered")
 
-# grab the parameters file from the command line
-PARAMS = load_params(sys.argv[1])
-
-# constants pertaining to the simulation, such as
-#       grid dimensions
-NUM_ROWS = PARAMS["num_row"]+2
-NUM_COLS = PARAMS["num_col"]+2
-GRID_SIZE = PARAMS["num_row"]
-# variable that will keep any for-loops using it from traversing the border of a grid
-ITERATOR_LIMIT = NUM_ROWS-1
-# disease parameters
-LATENT_PERIOD = PARAMS["latent_period"]
-INFECTIOUS_PERIOD = PARAMS["infectious_period"]
-CONTACT_TYPE = PARAMS["vonNeumann"]
-MAX_EXPOSURE = PARAMS["max_exposure"]
-
-# Create the two grids for the simulation
-# Each index represents a location an individual can occupy
-# The first 2D array / grid represents the current state of the simulation
-# The second grid will represent the state of the disease spread based on the first grid
+# Each index of a grid represents a location an individual can occupy.
 # Each element in the grid represents a location in the world as a tuple with the following schema:
     # (a, b, c, d, e) = (location state, days latent, days infectious, time exposed, individual id)
         # 'a' can be 1 (occupied by susceptible individual), 2 (occupied by latent individual), 
@@ -46,144 +41,399 @@ MAX_EXPOSURE = PARAMS["max_exposure"]
         # 'd' is a float value that represents the time someone maintained close contact with an infectious individual
         # 'e' is a number given to an individual to identify them in the end-of-day report
         # if an element is (0,0,0,0,0), the location is unoccupied
-SIM_MATRICES = np.zeros((3, NUM_ROWS, NUM_COLS), dtype=object)
 
 # the `if __name__ == "__main__":` at the very bottom of this script calls this function
 def main():
-    # variables that count the number of susceptible, infectious, latent, and recovered individuals in the population
-    num_susceptible = PARAMS["population"] - PARAMS["init_infected"]
-    num_infectious = PARAMS["init_infected"]
-    num_latent = 0
-    num_recovered = 0
-
-    # used to give each individual in the population a unique ID
-    individual_counter = 1
-
+    # grab the parameters file from the command line
+    params = load_params(sys.argv[1])
+    try:
+        check_params(params)
     # if the population value is too large to fit in the simulation grid, warn the user and end program
-    if PARAMS["population"] > GRID_SIZE*GRID_SIZE:
-        print("The population -", PARAMS["population"], "- is too great to fit within the grid borders.\nPlease select a population less than or equal to", GRID_SIZE*GRID_SIZE)
+    except ValueError as error:
+        print(error)
+        return
+    # progress lines and grid snapshots go through the tracer picked by `verbosity` (see `../SimTools/SIMtrace_Matamoros.py`)
+    tracer = trace.from_params(params, "cells")
+    # per-phase timers and counters, and optionally cProfile or a sampling profiler, if `profile` is set
+    #       (see `../SimTools/SIMprofile_Matamoros.py`)
+    profiler = profiling.from_params(params)
+    profiler.start()
+    # pick up an earlier run from its checkpoint if `resume_file` is set, or start a new one. A resumed run
+    #       keeps the params and seed it was started with.
+    if params.get("resume_file"):
+        simulation = Simulation.resume(params["resume_file"], tracer, profiler)
     else:
-        # initialize all grids to zeros
-        for a in range(0, 3):
-            for b in range(NUM_ROWS):
-                for c in range(NUM_COLS):
-                    SIM_MATRICES[a][b][c] = (0, 0, 0, 0, 0)
-                    
-        # These following two while loops will only place individuals randomly in the first grid so as to leave
-        #       a border of zeros around the grid's outside. E.G.
-        #       GRID A ->   |0 0 0 0 0| (the 'X' spots are usable; the '0' spots aren't)
-        #                   |0 X X X 0|
-        #                   |0 X X X 0|
-        #                   |0 X X X 0|
-        #                   |0 0 0 0 0|
-
-        # disperse all initially infected individuals randomly throughout the first grid,
-        #       but only place them in unoccupied locations
-        y = num_infectious
-        while y > 0:
-            randx = random.randint(1, NUM_ROWS-2)
-            randy = random.randint(1, NUM_COLS-2)
-            if SIM_MATRICES[0][randx][randy][0] == 0:
-                SIM_MATRICES[0][randx][randy] = (3, 0, 0, 0, individual_counter)
-                y -= 1
-                individual_counter += 1
-
-        # disperse all susceptible individuals (which is total population minus the initial infectious individuals)
-        #       randomly throughout the first grid but only place them in unoccupied locations
-        x = num_susceptible
-        while x > 0:
-            randx = random.randint(1, NUM_ROWS-2)
-            randy = random.randint(1, NUM_COLS-2)
-            if SIM_MATRICES[0][randx][randy][0] == 0:
-                SIM_MATRICES[0][randx][randy] = (1, 0, 0, 0, individual_counter)
-                x -= 1
-                individual_counter += 1
-
-        # main simulation block
-        # open a 'csv' file for outputting the daily reports, explained later
-        with open("CAoutput.csv", 'w') as outfile:
-            outfile.write("day,susceptible,latent,infectious,recovered\n")
-            num_days = 0
-            # loop until there are no individuals in the infectious nor latent stages
-            while num_infectious or num_latent:
-                # this variable keeps our for loops from interating over a border element.
-                # Remember that our grid is surrounded by a layer of zeros so we don't get
-                #       out-of-bounds errors when checking a cell's neighbors. We will only
-                #       iterate over the cells within the border of zeros.
-                for row in range(1, ITERATOR_LIMIT):
-                    for col in range(1, ITERATOR_LIMIT):
-                        # if a spot is unoccupied
-                        if SIM_MATRICES[0][row][col][0] == 0 or SIM_MATRICES[0][row][col][0] == 4:
-                            SIM_MATRICES[1][row][col] = SIM_MATRICES[0][row][col]
-                        # if a spot is occupied by a susceptible person
-                        elif SIM_MATRICES[0][row][col][0] == 1:
-                            SIM_MATRICES[1][row][col], num_latent, num_susceptible = infect(SIM_MATRICES[0][row][col], (row, col), num_latent, num_susceptible)
-                        # if a spot is occupied by an latent person
-                        elif SIM_MATRICES[0][row][col][0] == 2:
-                            SIM_MATRICES[1][row][col], num_infectious, num_latent = infectious(SIM_MATRICES[0][row][col], num_infectious, num_latent)
-                        # if a spot is occupied by a infectious person
-                        elif SIM_MATRICES[0][row][col][0] == 3:
-                            SIM_MATRICES[1][row][col], num_infectious, num_recovered = recovered(SIM_MATRICES[0][row][col], num_infectious, num_recovered)
-
-                # copy second grid to first grid and begin the next day of the simulation, zero-ing out grid 2
-                for row in range(1, ITERATOR_LIMIT):
-                    for col in range(1, ITERATOR_LIMIT):
-                        SIM_MATRICES[0][row][col] = SIM_MATRICES[1][row][col]
-                        SIM_MATRICES[1][row][col] = (0,0,0,0,0)
-                        print(SIM_MATRICES[0][row][col][0], end='', flush=True)
-                    print()
-                print('---------------------------')
-                # outputs the end-of-day state of the grid to csv output file
-                outfile.write(str(num_days)+','+str(num_susceptible)+','+str(num_latent)+','+str(num_infectious)+','+str(num_recovered)+'\n')
-                # print(num_days)
-                num_days += 1
+        simulation = Simulation(params, params.get("seed"), tracer, profiler)
+    # the daily report goes to `output_file` (or a list of files): a `.npz` or `.parquet` file gets the
+    #       compressed columnar format from `../SimTools/SIMoutput_Matamoros.py`, anything else gets the csv report
+    metadata = {"model": "ca", "params": simulation.params, "seed": simulation.seed, "engine_version": ENGINE_VERSION}
+    with simulation, output.open_sinks(params.get("output_file", "CAoutput.csv"), REPORT_COLUMNS, metadata, CSVSink) as sink:
+        # run to the end, saving a checkpoint to `checkpoint_file` every `checkpoint_every` days if it's set
+        checkpoints.run_to_end(simulation, params)
+        simulation.finish(sink)
+    profiler.stop()
+    tracer.close()
+    profiler.write(params.get("profile_file", "profile.json"))
+
+# raise a ValueError if the params describe a simulation that can't be run
+def check_params(params):
+    # if the population value is too large to fit in the simulation grid, refuse to run
+    if params["population"] > params["num_row"]*params["num_col"]:
+        raise ValueError("The population - "+str(params["population"])+" - is too great to fit within the grid borders.\nPlease select a population less than or equal to "+str(params["num_row"]*params["num_col"]))
+    # the initially infected people are part of the population, so there can't be more of them than people
+    #       (the counts would go negative and the run would never end)
+    if params["init_infected"] < 0:
+        raise ValueError("The number of initially infected people can't be negative.")
+    if params["init_infected"] > params["population"]:
+        raise ValueError("The number of initially infected people - "+str(params["init_infected"])+" - is greater than the population - "+str(params["population"])+". Lower it, and restart the program.")
+    # a misspelled engine would otherwise quietly run the slow tuple loop
+    if params.get("engine", "loop") not in ENGINES:
+        raise ValueError("Unknown engine "+repr(params["engine"])+"; pick one of "+", ".join(ENGINES)+".")
+    # the animation is drawn from the recorded days, so it needs somewhere to record them
+    if params.get("animation_file") and not params.get("record_file"):
+        raise ValueError("An animation_file needs a record_file to record the days it shows.")
+
+# run one realization of the simulation described by `params` (the dictionary `load_params` returns).
+#       `seed` makes the initial placement, and so the whole run, repeatable. If a `sink` is given, every
+#       day's report row (see `REPORT_COLUMNS`) is written to it, and if a `tracer` is given, it is told
+#       about every day and gets a snapshot of the grid when it asks for one. If params has a `record_file`,
+#       every day's grid of location states is recorded there (see `../SimTools/SIMframes_Matamoros.py`),
+#       with room for `record_capacity` days set aside up front. A `profiler` (see
+#       `../SimTools/SIMprofile_Matamoros.py`) times each stage of the day and counts the cells visited.
+#       Returns an array with one row per day holding the number of susceptible, latent, infectious,
+#       and recovered individuals at the end of that day.
+def simulate(params, seed=None, sink=None, tracer=None, profiler=None):
+    with Simulation(params, seed, tracer, profiler) as simulation:
+        for day, counts in simulation.run():
+            pass
+        return simulation.finish(sink)
+
+# Writes the daily reports to a 'csv' file, one line per day. The file is only created once the first
+#       day is written.
+class CSVSink(output.Sink):
+    def __init__(self, path):
+        self.path = path
+        self.outfile = None
+
+    def write_day(self, row):
+        if self.outfile is None:
+            self.outfile = open(self.path, 'w')
+            self.outfile.write(','.join(REPORT_COLUMNS)+'\n')
+        self.outfile.write(','.join(str(value) for value in row)+'\n')
+
+    def close(self):
+        if self.outfile is not None:
+            self.outfile.close()
+
+# the engines that keep the grid as arrays (see `CAengine_Matamoros.py`); the "loop" engine uses the tuple grid
+ARRAY_ENGINES = ("vectorized", "active", "tiled")
+ENGINES = ("loop",) + ARRAY_ENGINES
+
+# One realization of the simulation described by `params`, simulated one day at a time (see `simulate` for
+#       the arguments). `step()` simulates the next day and returns its number and its {"S", "L", "I", "R"}
+#       counts, and `run(days)` is a generator that does the same for every day until the outbreak ends (or
+#       for at most `days` days), so a caller can watch a run as it goes or stop it early. `checkpoint(path)`
+#       saves the whole run, random number generator included (see `../SimTools/SIMcheckpoint_Matamoros.py`),
+#       and `Simulation.resume(path)` carries on from it exactly as if it had never stopped. `finish(sink)`
+#       writes the daily reports and returns the daily counts like `simulate` does, and `close()` stops the
+#       tiled engine's workers and the frame recorder. Works as a context manager too.
+class Simulation:
+    def __init__(self, params, seed=None, tracer=None, profiler=None, checkpoint=None):
+        check_params(params)
+        if tracer is None:
+            tracer = trace.Tracer(trace.SILENT)
+        if profiler is None:
+            profiler = profiling.NullProfiler()
+        self.params = params
+        self.seed = seed
+        self.tracer = tracer
+        self.profiler = profiler
+        self.engine = params.get("engine", "loop")
+        self.rng = np.random.default_rng(seed)
+        self.sim_matrices = None
+        self.active = None
+        self.tiled = None
+        self.recorder = None
+
+        if checkpoint is None:
+            # variables that count the number of susceptible, infectious, latent, and recovered individuals in the population
+            self.num_susceptible = params["population"] - params["init_infected"]
+            self.num_infectious = params["init_infected"]
+            self.num_latent = 0
+            self.num_recovered = 0
+            # the end-of-day counts of every day simulated so far
+            self.series = []
+
+            # Place everyone on distinct cells of a fresh grid in one go, leaving a border of zeros around the grid's
+            #       outside. E.G.
+            #       GRID A ->   |0 0 0 0 0| (the 'X' spots are usable; the '0' spots aren't)
+            #                   |0 X X X 0|
+            #                   |0 X X X 0|
+            #                   |0 X X X 0|
+            #                   |0 0 0 0 0|
+            #       The initially infected individuals get IDs 1 to `init_infected`, and the susceptible individuals
+            #       the IDs after that. With a `density_file`, crowded cells are more likely to be picked.
+            with profiler.phase("setup"):
+                density = None
+                if params.get("density_file"):
+                    density = load_density(params["density_file"], params["num_row"], params["num_col"])
+                grid = engine.new_grid(params["num_row"], params["num_col"])
+                engine.place(grid, self.rng, self.num_infectious, self.num_susceptible, density)
+        else:
+            # carry on from a checkpoint: the grid, counts, and days so far are all saved in it
+            state, arrays = checkpoint
+            self.num_susceptible, self.num_latent, self.num_infectious, self.num_recovered = state["counts"]
+            self.series = [tuple(row) for row in arrays["series"].tolist()]
+            self.rng.bit_generator.state = state["rng"]
+            with profiler.phase("setup"):
+                grid = engine.new_grid(params["num_row"], params["num_col"])
+                for name, array in grid.items():
+                    array[...] = arrays["grid_"+name]
+
+        # optionally record every day's grid to a memory-mapped frame file. A resumed run keeps the days
+        #       recorded up to its checkpoint and records the rest after them.
+        if params.get("record_file"):
+            self.recorder = frames.FrameRecorder(params["record_file"], params["num_row"], params["num_col"],
+                                                 params.get("record_capacity", 1024), keep=len(self.series))
+
+        try:
+            with profiler.phase("setup"):
+                if self.engine not in ARRAY_ENGINES:
+                    # The first tuple grid represents the current state of the simulation
+                    # The second grid will represent the state of the disease spread based on the first grid
+                    self.sim_matrices = np.empty((2,)+grid["state"].shape, dtype=object)
+                    self.sim_matrices[0] = engine.to_object_grid(grid)
+                    self.sim_matrices[1].fill((0, 0, 0, 0, 0))
+                elif self.engine == "active":
+                    self.active = engine.active_set(grid)
+                elif self.engine == "tiled":
+                    # the "tiled" engine splits the grid between `workers` processes (every core by default)
+                    self.tiled = tiles.TiledGrid(grid, params, params.get("workers") or os.cpu_count())
+                    grid = self.tiled.grid
+        except BaseException:
+            self.close()
+            raise
+        self.grid = grid
+        self.cells = engine.band(grid, 0, grid["state"].shape[0]-2)
+        tracer.begin()
+
+    # read a checkpoint saved by `checkpoint` and carry on from it
+    @classmethod
+    def resume(cls, path, tracer=None, profiler=None):
+        state, arrays = checkpoints.load_checkpoint(path, "ca", ENGINE_VERSION)
+        return cls(state["params"], state["seed"], tracer, profiler, checkpoint=(state, arrays))
+
+    # True once there are no individuals in the infectious nor latent stages
+    @property
+    def done(self):
+        return not (self.num_infectious or self.num_latent)
+
+    # simulate the next day. Returns the day's number and its end-of-day counts.
+    def step(self):
+        if self.done:
+            raise RuntimeError("The outbreak is over; there are no days left to simulate.")
+        if self.sim_matrices is not None:
+            visited = self.step_loop()
+            state = lambda: state_grid(self.sim_matrices[0])
+        else:
+            visited = self.step_arrays()
+            state = lambda: self.grid["state"][1:-1, 1:-1]
+        self.profiler.count("cells_visited", visited)
+        # keep the end-of-day counts for the daily report
+        self.series.append((self.num_susceptible, self.num_latent, self.num_infectious, self.num_recovered))
+        with self.profiler.phase("report"):
+            report_day(self.tracer, self.recorder, self.series, visited, state)
+        return len(self.series)-1, {"S": self.num_susceptible, "L": self.num_latent, "I": self.num_infectious, "R": self.num_recovered}
+
+    # simulate up to `days` more days (every day until the outbreak ends if `days` is None), giving each
+    #       day's number and counts as it finishes
+    def run(self, days=None):
+        simulated = 0
+        while not self.done and (days is None or simulated < days):
+            yield self.step()
+            simulated += 1
+
+    # simulate a day by visiting every cell of the tuple grid in Python. Returns the number of cells visited.
+    def step_loop(self):
+        sim_matrices = self.sim_matrices
+        params = self.params
+        num_susceptible, num_latent, num_infectious, num_recovered = self.num_susceptible, self.num_latent, self.num_infectious, self.num_recovered
+        # this variable keeps our for loops from interating over a border element.
+        # Remember that our grid is surrounded by a layer of zeros so we don't get
+        #       out-of-bounds errors when checking a cell's neighbors. We will only
+        #       iterate over the cells within the border of zeros.
+        row_limit = sim_matrices.shape[1]-1
+        col_limit = sim_matrices.shape[2]-1
+        with self.profiler.phase("sweep"):
+            for row in range(1, row_limit):
+                for col in range(1, col_limit):
+                    # if a spot is unoccupied
+                    if sim_matrices[0][row][col][0] == 0 or sim_matrices[0][row][col][0] == 4:
+                        sim_matrices[1][row][col] = sim_matrices[0][row][col]
+                    # if a spot is occupied by a susceptible person
+                    elif sim_matrices[0][row][col][0] == 1:
+                        sim_matrices[1][row][col], num_latent, num_susceptible = infect(sim_matrices[0], (row, col), num_latent, num_susceptible, params)
+                    # if a spot is occupied by an latent person
+                    elif sim_matrices[0][row][col][0] == 2:
+                        sim_matrices[1][row][col], num_infectious, num_latent = infectious(sim_matrices[0][row][col], num_infectious, num_latent, params)
+                    # if a spot is occupied by a infectious person
+                    elif sim_matrices[0][row][col][0] == 3:
+                        sim_matrices[1][row][col], num_infectious, num_recovered = recovered(sim_matrices[0][row][col], num_infectious, num_recovered, params)
+
+        # copy second grid to first grid and begin the next day of the simulation, zero-ing out grid 2
+        with self.profiler.phase("copy_back"):
+            for row in range(1, row_limit):
+                for col in range(1, col_limit):
+                    sim_matrices[0][row][col] = sim_matrices[1][row][col]
+                    sim_matrices[1][row][col] = (0,0,0,0,0)
+        self.num_susceptible, self.num_latent, self.num_infectious, self.num_recovered = num_susceptible, num_latent, num_infectious, num_recovered
+        return (row_limit-1)*(col_limit-1)
+
+    # simulate a day with array operations from `CAengine_Matamoros.py`. The "vectorized" engine updates the
+    #       whole grid every day, the "active" engine only visits latent and infectious people and their
+    #       neighbours, and the "tiled" engine updates the whole grid split between worker processes
+    #       (see `CAtiles_Matamoros.py`). Returns the number of cells visited.
+    def step_arrays(self):
+        profiler = self.profiler
+        if self.tiled is not None:
+            visited = self.cells["state"].size
+            with profiler.phase("step"):
+                new_latent, new_infectious, new_recovered = self.tiled.step()
+        elif self.active is None:
+            # the same as `engine.step`, split up so the two sweeps over the grid are timed separately
+            visited = self.cells["state"].size
+            with profiler.phase("neighbors"):
+                neighbors = engine.count_infectious_neighbors(self.grid["state"], self.params["vonNeumann"])
+            with profiler.phase("update"):
+                new_latent, new_infectious, new_recovered = engine.update(self.cells, neighbors, self.params)
+        else:
+            visited = len(self.active["latent"]) + len(self.active["infectious"])
+            with profiler.phase("step"):
+                new_latent, new_infectious, new_recovered = engine.step_active(self.grid, self.active, self.params)
+        self.num_susceptible -= new_latent
+        self.num_latent += new_latent - new_infectious
+        self.num_infectious += new_infectious - new_recovered
+        self.num_recovered += new_recovered
+        return visited
+
+    # save the whole run to `path` so `Simulation.resume(path)` can carry on from today
+    def checkpoint(self, path):
+        grid = self.grid if self.sim_matrices is None else engine.from_object_grid(self.sim_matrices[0])
+        arrays = {"grid_"+name: array for name, array in grid.items()}
+        arrays["series"] = np.array(self.series, dtype=np.int64).reshape(-1, 4)
+        state = {
+            "params": self.params,
+            "seed": self.seed,
+            "counts": [self.num_susceptible, self.num_latent, self.num_infectious, self.num_recovered],
+            "rng": self.rng.bit_generator.state,
+        }
+        checkpoints.save_checkpoint(path, "ca", ENGINE_VERSION, state, arrays)
+
+    # send the daily reports to the output sink, if there is one, and draw the run if params ask for it:
+    #       the compartment curves to `plot_file`, the last day's grid to `image_file`, and every
+    #       `animation_every`-th recorded day to the animated GIF `animation_file` (see
+    #       `../SimTools/SIMrender_Matamoros.py`). Returns an array with one row per day holding the number of
+    #       susceptible, latent, infectious, and recovered individuals at the end of that day.
+    def finish(self, sink=None):
+        series = np.array(self.series, dtype=np.int64).reshape(-1, 4)
+        with self.profiler.phase("output"):
+            if sink is not None:
+                for num_days, row in enumerate(series):
+                    sink.write_day((num_days,)+tuple(row))
+        with self.profiler.phase("render"):
+            if self.params.get("plot_file"):
+                render.plot_compartments(series, self.params["plot_file"])
+            if self.params.get("image_file"):
+                if self.sim_matrices is not None:
+                    state = state_grid(self.sim_matrices[0])
+                else:
+                    state = self.grid["state"][1:-1, 1:-1]
+                render.save_frame(state, self.params["image_file"])
+            if self.params.get("animation_file") and self.recorder is not None:
+                # the recorder's memory-mapped days, read one at a time as the animation is drawn
+                render.save_animation(self.recorder.data[:self.recorder.frames], self.params["animation_file"],
+                                      every=self.params.get("animation_every", 1))
+        return series
+
+    def close(self):
+        if self.tiled is not None:
+            self.tiled.close()
+            self.tiled = None
+            self.grid = {}
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 ##############################################################################################################
 #                                              FUNCTIONS
 ##############################################################################################################
 
+# tell the tracer about the day that just finished, which took `cells` cell updates, and record the day's
+#       grid if there is a recorder. `state` is only called (to build the grid of location states) when
+#       someone needs it.
+def report_day(tracer, recorder, series, cells, state):
+    num_susceptible, num_latent, num_infectious, num_recovered = series[-1]
+    tracer.day(len(series)-1, {"S": num_susceptible, "L": num_latent, "I": num_infectious, "R": num_recovered}, cells)
+    if tracer.snapshots or recorder is not None:
+        grid = state()
+        if tracer.snapshots:
+            tracer.snapshot(grid)
+        if recorder is not None:
+            recorder.append(grid)
+
+# the location state ('a') of every interior cell of a tuple grid, as an array
+def state_grid(matrix):
+    return np.array([[cell[0] for cell in row[1:-1]] for row in matrix[1:-1]], dtype=np.uint8)
+
 # An individuals is infected if the sum of infectious neighbors equals or surpasses the "exposure points" limit
 #       set in `PARAMS.json`
-def infect(individual, location, latent_count, susecptible_count):
+def infect(matrix, location, latent_count, susecptible_count, params):
+    individual = matrix[location[0]][location[1]]
     # sum up the number of exposure points the susceptible individual has accumulated
-    total_exposure = individual[3] + checkNeighbors(location)
+    total_exposure = individual[3] + checkNeighbors(matrix, location, params["vonNeumann"])
     # if the individual has less than the number of exposure points necessary to get infected
     #       return the sum of their current exposure point count and the new ones from this
     #       function call
-    if total_exposure < MAX_EXPOSURE:
+    if total_exposure < params["max_exposure"]:
         return (1,0,0,total_exposure,individual[4]), latent_count, susecptible_count
     else:
         return (2,0,0,0,individual[4]), (latent_count+1), (susecptible_count-1)
 
 # count how many infectious neighbors an individual has
-def checkNeighbors(location):
+def checkNeighbors(matrix, location, von_neumann):
     count = 0
     # if using the von Neumann method, just check the north, south, east, and west neighbors
-    if SIM_MATRICES[0][location[0]][location[1]+1][0] == 3:
+    if matrix[location[0]][location[1]+1][0] == 3:
         count += 1
-    if SIM_MATRICES[0][location[0]-1][location[1]][0] == 3:
+    if matrix[location[0]-1][location[1]][0] == 3:
         count += 1
-    if SIM_MATRICES[0][location[0]][location[1]-1][0] == 3:
+    if matrix[location[0]][location[1]-1][0] == 3:
         count += 1
-    if SIM_MATRICES[0][location[0]+1][location[1]][0] == 3:
+    if matrix[location[0]+1][location[1]][0] == 3:
         count += 1
     # if using the Moore method, consider the corner neighbors
-    if not CONTACT_TYPE:
-        if SIM_MATRICES[0][location[0]-1][location[1]+1][0] == 3:
+    if not von_neumann:
+        if matrix[location[0]-1][location[1]+1][0] == 3:
             count += 1
-        if SIM_MATRICES[0][location[0]-1][location[1]-1][0] == 3:
+        if matrix[location[0]-1][location[1]-1][0] == 3:
             count += 1
-        if SIM_MATRICES[0][location[0]+1][location[1]-1][0] == 3:
+        if matrix[location[0]+1][location[1]-1][0] == 3:
             count += 1
-        if SIM_MATRICES[0][location[0]+1][location[1]+1][0] == 3:
+        if matrix[location[0]+1][location[1]+1][0] == 3:
             count += 1
     return count
 
 # determine if a latent individual jumps to the infectious stage
-def infectious(individual, infectious_count, latent_count):
+def infectious(individual, infectious_count, latent_count, params):
     # if the individual has not been in the latent stage for the latent period,
     #       increment the 'b' index in the individual's tuple
-    if individual[1] < LATENT_PERIOD:
+    if individual[1] < params["latent_period"]:
         return (2,individual[1]+1,0,0,individual[4]), (infectious_count), (latent_count)
     # if the individual has been in the latent stage for the latent period,
     #       increment the 'a' index of the individual's tuple
@@ -191,10 +441,10 @@ def infectious(individual, infectious_count, latent_count):
         return (3,0,0,0,individual[4]), (infectious_count+1), (latent_count-1)
 
 # determine if an infectious individual jumps to the recovered stage
-def recovered(individual, infectious_count, recovered_count):
+def recovered(individual, infectious_count, recovered_count, params):
     # if the individual has not been in the infectious stage for the infectious period,
     #       increment the 'c' index in the individual's tuple
-    if individual[2] < INFECTIOUS_PERIOD:
+    if individual[2] < params["infectious_period"]:
         return (3,0,individual[2]+1,0,individual[4]), infectious_count, recovered_count
     # if the individual has been in the infectious stage for the infectious period,
     #       increment the 'a' index of the individual's tuple
@@ -0,0 +1,153 @@
+# Cellular Automata Program 1 - Tiled Engine
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module splits the array grid of `CAengine_Matamoros.py` into stripes of rows and simulates each
+#       stripe in its own worker process. The grid arrays live in shared memory, so no worker copies them.
+#       A cell only looks at its eight neighbours, so a stripe only needs the one row above and below it
+#       (its "halo") on top of its own rows, the same way the border of zeros lets the tuple grid skip
+#       bounds checks. Each day happens in two passes that every worker finishes before the next one starts:
+#           1. every worker counts the infectious neighbours of its stripe, reading the halo rows
+#           2. every worker moves its stripe through the day and reports its latent/infectious/recovered
+#              counts, which the main process adds up
+#       Since nobody changes a cell until everyone has counted their neighbours, every cell sees the grid as
+#       it was at the start of the day and the result is exactly the same as a single-process run.
+#       The workers wait for each other between the two passes, while the main process hands out days and
+#       collects the counts through a pipe to each worker, so it notices right away if a worker dies.
+
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from multiprocessing import shared_memory
+import numpy as np
+import CAengine_Matamoros as engine
+
+# the grid arrays the workers update. IDs never change, so they stay in the main process.
+SHARED_FIELDS = ("state", "days_latent", "days_infectious", "exposure")
+
+# create a shared memory block holding a copy of `array`. Returns the block and an array using it.
+def share(array):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, shared
+
+# the body of one worker process, which simulates grid rows `start` to `stop` each time the main process
+#       sends a day through `connection`, until it sends None. `layout` lists the (block name, shape, dtype)
+#       of every shared grid array.
+def work(layout, start, stop, params, barrier, connection):
+    blocks = {name: shared_memory.SharedMemory(name=block_name) for name, (block_name, shape, dtype) in layout.items()}
+    try:
+        simulate_band(blocks, layout, start, stop, params, barrier, connection)
+    except BaseException:
+        # wake up the other workers instead of leaving them waiting for this one
+        barrier.abort()
+        raise
+    for block in blocks.values():
+        block.close()
+
+def simulate_band(blocks, layout, start, stop, params, barrier, connection):
+    grid = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf) for name, (block_name, shape, dtype) in layout.items()}
+    cells = engine.band(grid, start, stop)
+    neighbors = np.empty(cells["state"].shape, dtype=np.uint8)
+    # tell the main process this worker is ready for its first day
+    connection.send(True)
+    while connection.recv() is not None:
+        engine.count_band_neighbors(grid, start, stop, params["vonNeumann"], out=neighbors)
+        # nobody may change their cells until every stripe has been counted
+        barrier.wait()
+        connection.send(engine.update(cells, neighbors, params))
+
+# send `message` to every worker. A worker that already died is skipped; `TiledGrid.step` notices it.
+def send_all(connections, message):
+    for connection in connections:
+        try:
+            connection.send(message)
+        except BrokenPipeError:
+            pass
+
+# Runs an array grid (see `CAengine_Matamoros.new_grid`) on `workers` processes. Use `grid` to look at the
+#       cells between days and `step()` to simulate a day, and `close()` when done, which stops the workers
+#       and frees the shared memory. Works as a context manager too.
+class TiledGrid:
+    def __init__(self, grid, params, workers):
+        context = mp.get_context()
+        num_rows = grid["state"].shape[0]-2
+        workers = max(1, min(workers, num_rows))
+
+        # copy the grid arrays into shared memory
+        self.blocks = []
+        self.grid = {"id": grid["id"]}
+        layout = {}
+        for name in SHARED_FIELDS:
+            block, self.grid[name] = share(grid[name])
+            self.blocks.append(block)
+            layout[name] = (block.name, grid[name].shape, grid[name].dtype.str)
+
+        # split the rows into one stripe per worker
+        # kept on `self` so it outlives the start of every worker
+        self.barrier = context.Barrier(workers)
+        bounds = np.linspace(0, num_rows, workers+1).astype(int)
+        self.processes = []
+        self.connections = []
+        for index in range(workers):
+            connection, worker_connection = context.Pipe()
+            args = (layout, int(bounds[index]), int(bounds[index+1]), params, self.barrier, worker_connection)
+            self.processes.append(context.Process(target=work, args=args, daemon=True))
+            self.connections.append(connection)
+        for process in self.processes:
+            process.start()
+        # wait until every worker is ready, so starting them counts as setup rather than as the first day
+        try:
+            self.collect()
+        except BaseException:
+            self.close()
+            raise
+
+    # simulate one day on every stripe. Returns how many people became latent, infectious, and recovered.
+    def step(self):
+        send_all(self.connections, True)
+        totals = [0, 0, 0]
+        for counts in self.collect():
+            for i, count in enumerate(counts):
+                totals[i] += count
+        return tuple(totals)
+
+    # wait for one message from every worker. Returns the messages in worker order.
+    def collect(self):
+        messages = {}
+        waiting = list(self.connections)
+        # workers only exit when told to, so a finished process or a closed pipe means one of them failed
+        sentinels = [process.sentinel for process in self.processes]
+        while waiting:
+            for ready in wait(waiting+sentinels):
+                try:
+                    if ready in sentinels:
+                        raise EOFError
+                    messages[ready] = ready.recv()
+                except EOFError:
+                    # the others may be stuck waiting for the failed worker at the barrier
+                    for process in self.processes:
+                        process.terminate()
+                    raise RuntimeError("A worker of the tiled engine stopped unexpectedly; see its error above.")
+                waiting.remove(ready)
+        return [messages[connection] for connection in self.connections]
+
+    def close(self):
+        send_all(self.connections, None)
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.connections = []
+        # the arrays must be gone before their memory can be released
+        self.grid = {}
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,118 @@
+# Cellular Automata Program 2 - Batched Contacts
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module makes a whole day's contacts at once. Instead of picking two people, updating the graph,
+#       and rolling for an infection one contact at a time, every contact pair of the day is drawn in one
+#       batch, infections are decided for the whole batch with one array of random numbers, and the contact
+#       weights are summed into a sparse matrix. A NetworkX graph is only built from that matrix when asked for.
+
+import numpy as np
+import networkx as nx
+from scipy import sparse
+import GraphPopulation_Matamoros as pop
+
+# randomly selects `num_pairs` pairs of two distinct individuals by their ID's, all at once. Rather than
+#       redrawing when both picks are the same person, the second person is the first one shifted by
+#       1 to N-1 places (wrapping around), which can never land on the first person and is still uniform.
+def draw_contact_pairs(rng, population_size, num_pairs):
+    person1 = rng.integers(0, population_size, size=num_pairs)
+    person2 = person1 + rng.integers(1, population_size, size=num_pairs)
+    person2[person2 >= population_size] -= population_size
+    return person1, person2
+
+# increment each person's contact count by the number of pairs they appear in
+def count_contacts(num_contacts, person1, person2):
+    size = len(num_contacts)
+    num_contacts += np.bincount(person1, minlength=size).astype(num_contacts.dtype)
+    num_contacts += np.bincount(person2, minlength=size).astype(num_contacts.dtype)
+
+# roll for an infection on every pair where one person is infectious and the other is susceptible.
+#       Infectiousness is taken from the state at the start of the batch, so people infected by this
+#       batch can't infect anyone else in it. Like `attempt_infection`, a contact infects when its random
+#       number is larger than the transmission rate.
+#       Returns the person infected and the infectious person who infected them for every successful
+#       contact (in draw order), and the number of infection attempts.
+def attempt_infections(rng, state, person1, person2, transmission_rate):
+    state1 = state[person1]
+    state2 = state[person2]
+    forward = (state1 == pop.INFECTIOUS) & (state2 == pop.SUSCEPTIBLE)
+    backward = (state2 == pop.INFECTIOUS) & (state1 == pop.SUSCEPTIBLE)
+    attempts = np.flatnonzero(forward | backward)
+    success = attempts[rng.random(len(attempts)) > transmission_rate]
+    targets = np.where(forward[success], person2[success], person1[success])
+    sources = np.where(forward[success], person1[success], person2[success])
+    return targets, sources, len(attempts)
+
+# several contacts can infect the same person in the same batch. Only the first of them (in draw order)
+#       counts, the same as the sequential loop where an infected person is no longer susceptible for the
+#       rest of the day, so nobody gets infected twice.
+#       Returns each newly infected person once, with the person who infected them.
+def resolve_infections(targets, sources):
+    targets, first = np.unique(targets, return_index=True)
+    return targets, sources[first]
+
+# Keeps the weight of every edge (the number of times two people contacted each other) in a sparse matrix.
+#       Only the upper triangle is stored, so the edge between `a` and `b` lives at (min(a, b), max(a, b)).
+#       New contacts are collected as coordinate lists and summed into the matrix in bulk once enough of
+#       them pile up, so duplicate pairs are added together without ever looking up single edges.
+#       `new_edges` and `edge_increments` count the contacts summed so far that made a new edge or added to
+#       the weight of an existing one, like the sequential loop's counters.
+class ContactMatrix:
+    def __init__(self, population_size):
+        self.population_size = population_size
+        self.matrix = sparse.csr_matrix((population_size, population_size), dtype=np.uint32)
+        self.pending_rows = []
+        self.pending_cols = []
+        self.num_pending = 0
+        self.new_edges = 0
+        self.edge_increments = 0
+
+    # record one contact between `person1[i]` and `person2[i]` for every `i`
+    def add(self, person1, person2):
+        self.pending_rows.append(np.minimum(person1, person2).astype(np.int32))
+        self.pending_cols.append(np.maximum(person1, person2).astype(np.int32))
+        self.num_pending += len(person1)
+        # summing is linear in the size of the matrix, so wait until the pending contacts are about as
+        #       large as the matrix itself before doing it again
+        if self.num_pending > max(self.matrix.nnz, 1 << 20):
+            self.flush()
+
+    # sum every pending contact into the matrix
+    def flush(self):
+        if self.num_pending:
+            rows = np.concatenate(self.pending_rows)
+            cols = np.concatenate(self.pending_cols)
+            weights = np.ones(len(rows), dtype=np.uint32)
+            shape = (self.population_size, self.population_size)
+            # converting to CSR adds up the weights of duplicate (row, col) pairs
+            num_edges = self.matrix.nnz
+            self.matrix = self.matrix + sparse.coo_matrix((weights, (rows, cols)), shape=shape).tocsr()
+            # every pair that wasn't in the matrix yet is a new edge; the rest only added weight
+            self.new_edges += self.matrix.nnz - num_edges
+            self.edge_increments += self.num_pending - (self.matrix.nnz - num_edges)
+            self.pending_rows = []
+            self.pending_cols = []
+            self.num_pending = 0
+
+    # the summed contact weights as a CSR matrix
+    def tocsr(self):
+        self.flush()
+        return self.matrix
+
+    # replace the summed contact weights with the CSR matrix made of `data`, `indices`, and `indptr`
+    #       (like the ones `tocsr()` returns), as when resuming from a checkpoint
+    def load(self, data, indices, indptr):
+        self.matrix = sparse.csr_matrix((data, indices, indptr), shape=(self.population_size, self.population_size))
+        self.pending_rows = []
+        self.pending_cols = []
+        self.num_pending = 0
+
+    # build a NetworkX graph with one node per person and one weighted edge per pair that made contact
+    def to_networkx(self):
+        edges = self.tocsr().tocoo()
+        graph = nx.Graph()
+        graph.add_nodes_from(range(self.population_size))
+        graph.add_weighted_edges_from(zip(edges.row.tolist(), edges.col.tolist(), edges.data.tolist()))
+        return graph
@@ -0,0 +1,110 @@
+# Cellular Automata Program 2 - Compiled Contact Kernel
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module runs a day's contacts one pair at a time, in order, exactly like the sequential loop in
+#       `GraphSLIR_Matamoros.py`: each contact is drawn, counted, and rolled for an infection before the
+#       next one, so a person infected earlier in the day is no longer susceptible to later contacts, and
+#       nobody infected today can infect anyone today. The difference is that the loop only touches typed
+#       NumPy arrays and draws its random numbers from an explicit generator state, so Numba can compile it
+#       to machine code when it is installed. Without Numba the very same functions run as plain Python.
+
+import numpy as np
+import GraphPopulation_Matamoros as pop
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# True when the kernel is compiled by Numba
+COMPILED = njit is not None
+
+# compile `function` with Numba if it's installed, otherwise leave it as plain Python
+def jit(function):
+    if njit is None:
+        return function
+    return njit(cache=True)(function)
+
+# constants of the splitmix64 generator below
+MASK64 = 0xFFFFFFFFFFFFFFFF
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+# turns the top 53 bits of a random 64-bit integer into a float in [0, 1)
+INV_2_53 = 1.0 / 9007199254740992.0
+
+# create the generator state for a seed (a random one if `seed` is None). Compiled, the state is a one-item
+#       uint64 array; in plain Python it's a one-item list holding a Python int. Either way, the kernel
+#       updates it in place, so the state carries on from one day to the next.
+def new_rng_state(seed=None):
+    state = int(np.random.SeedSequence(seed).generate_state(1, np.uint64)[0])
+    if COMPILED:
+        return np.array([state], dtype=np.uint64)
+    return [state]
+
+# the splitmix64 generator: advance the state by a fixed odd constant and scramble it into a random number.
+#       Returns a float in [0, 1). The masks keep plain Python ints to 64 bits, like the compiled uint64 math.
+@jit
+def next_random(rng_state):
+    state = (rng_state[0] + GOLDEN_GAMMA) & MASK64
+    rng_state[0] = state
+    z = ((state ^ (state >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    z = z ^ (z >> 31)
+    return (z >> 11) * INV_2_53
+
+# make `len(person1)` contacts in order. For each one, two distinct people are picked at random (the second
+#       one is the first one shifted by 1 to N-1 places, like `GraphContacts_Matamoros.draw_contact_pairs`),
+#       their contact counts go up, the pair is written to `person1[k]` and `person2[k]` so the caller can add
+#       the day's edge weights in bulk, and if one of them is infectious and the other susceptible, the
+#       susceptible one becomes latent when a random number is larger than the transmission rate.
+#       Returns the number of people who became latent, the number of infections counted in the daily report
+#       (only those where the first person picked was infectious, like the sequential loop), and the number
+#       of infection attempts.
+@jit
+def contact_day(state, num_contacts, person1, person2, population_size, transmission_rate, rng_state):
+    new_latent = 0
+    daily_infections = 0
+    attempts = 0
+    for k in range(len(person1)):
+        a = int(next_random(rng_state) * population_size)
+        b = a + 1 + int(next_random(rng_state) * (population_size - 1))
+        if b >= population_size:
+            b -= population_size
+        person1[k] = a
+        person2[k] = b
+        num_contacts[a] += 1
+        num_contacts[b] += 1
+        if state[a] == pop.INFECTIOUS and state[b] == pop.SUSCEPTIBLE:
+            attempts += 1
+            if next_random(rng_state) > transmission_rate:
+                state[b] = pop.LATENT
+                new_latent += 1
+                daily_infections += 1
+        elif state[b] == pop.INFECTIOUS and state[a] == pop.SUSCEPTIBLE:
+            attempts += 1
+            if next_random(rng_state) > transmission_rate:
+                state[a] = pop.LATENT
+                new_latent += 1
+    return new_latent, daily_infections, attempts
+
+# Owns the preallocated pair buffers and the generator state of one run
+class ContactKernel:
+    def __init__(self, num_pairs, seed=None):
+        self.person1 = np.zeros(num_pairs, dtype=np.int64)
+        self.person2 = np.zeros(num_pairs, dtype=np.int64)
+        self.rng_state = new_rng_state(seed)
+
+    # compile the kernel now (a no-op without Numba) so it isn't counted as part of the first day
+    def warm_up(self, population):
+        empty = np.zeros(0, dtype=np.int64)
+        contact_day(population["state"], population["num_contacts"], empty, empty, 2, 1.0, self.rng_state)
+
+    # make one day's contacts. Returns the same three numbers as `contact_day`; the day's pairs are left in
+    #       `person1` and `person2`.
+    def day(self, population, transmission_rate):
+        population_size = len(population["state"])
+        return contact_day(population["state"], population["num_contacts"], self.person1, self.person2,
+                           population_size, transmission_rate, self.rng_state)
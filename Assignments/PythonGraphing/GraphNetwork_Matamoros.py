@@ -0,0 +1,175 @@
+# Cellular Automata Program 2 - Contact Networks
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module builds a fixed contact network for the "network" contact mode. In the other modes anyone can
+#       meet anyone, so the contact graph ends up as a dense random mesh. Here, people only ever meet their
+#       neighbours in the network, and since only infectious people can spread the disease, each day only
+#       infectious people make contacts. A day then costs time in proportion to the number of infectious
+#       people and their contacts instead of the whole population.
+#       The network is made of one or more layers, whose edges are combined:
+#           {"model": "households", "size": S}                  -> everyone is put in a household of about S
+#                                                                  people (1 + a Poisson number), all knowing each other
+#           {"model": "workplaces", "size": S, "employed": F}   -> a share F (default 1) of people is put in
+#                                                                  workplaces of about S people the same way
+#           {"model": "watts_strogatz", "k": K, "p": P}         -> a ring where everyone knows the K/2 people on
+#                                                                  either side, with each of those links moved to
+#                                                                  a random person with probability P (small world)
+#           {"model": "barabasi_albert", "m": M}                -> people join one at a time and link to M people
+#                                                                  already there, picked in proportion to how many
+#                                                                  links they have (a few people know very many)
+#           {"model": "edge_list", "file": PATH}                -> "person1 person2" lines, like `export_graph`
+#                                                                  writes; anything after the two IDs is ignored
+#       The network is kept as a CSR adjacency: the neighbours of person `i` are
+#       `indices[indptr[i]:indptr[i+1]]`. Every link is stored in both directions, once, without self-loops.
+
+import numpy as np
+
+# the network used when the params don't have one: households of about four, and workplaces of about
+#       twenty for 60% of the people
+DEFAULT_LAYERS = [
+    {"model": "households", "size": 4},
+    {"model": "workplaces", "size": 20, "employed": 0.6},
+]
+
+MODELS = ("households", "workplaces", "watts_strogatz", "barabasi_albert", "edge_list")
+
+# A fixed, undirected contact network of `population_size` people as a CSR adjacency (see the top)
+class ContactNetwork:
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+        self.population_size = len(indptr)-1
+
+    # build the network from a list of links between `person1[i]` and `person2[i]`. Self-loops and repeated
+    #       links are dropped, and every link is stored in both directions.
+    @classmethod
+    def from_edges(cls, population_size, person1, person2):
+        person1 = np.asarray(person1, dtype=np.int64)
+        person2 = np.asarray(person2, dtype=np.int64)
+        keep = person1 != person2
+        # every link in both directions as one number, row * N + col, sorted so equal links sit together and
+        #       the rows come out in order (a plain sort of one integer is much faster than `np.unique` or
+        #       sorting by two keys)
+        links = np.concatenate((person1[keep]*population_size + person2[keep], person2[keep]*population_size + person1[keep]))
+        links.sort()
+        links = links[np.concatenate(([True], links[1:] != links[:-1]))]
+        rows, cols = np.divmod(links, population_size)
+        indptr = np.zeros(population_size+1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=population_size), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int32))
+
+    # the number of neighbours of every person
+    def degree(self):
+        return np.diff(self.indptr)
+
+    # the number of links in the network
+    def num_edges(self):
+        return len(self.indices)//2
+
+    # every person in `people` makes a Poisson number of contacts with mean `contacts_per_person`, each with
+    #       a neighbour picked at random (the same neighbour can be picked more than once). People without
+    #       neighbours make none.
+    #       Returns the pairs as two arrays: the person from `people` making the contact, and the neighbour.
+    def draw_contacts(self, rng, people, contacts_per_person):
+        people = people[self.indptr[people+1] > self.indptr[people]]
+        person1 = np.repeat(people, rng.poisson(contacts_per_person, size=len(people)))
+        start = self.indptr[person1]
+        degree = self.indptr[person1+1] - start
+        person2 = self.indices[start + (rng.random(len(person1))*degree).astype(np.int64)]
+        return person1, person2.astype(np.int64)
+
+# raise a ValueError if `layers` (one layer or a list of them, see the top) can't be built
+def check_layers(layers):
+    for layer in ([layers] if isinstance(layers, dict) else layers):
+        if layer.get("model") not in MODELS:
+            raise ValueError("Unknown network model "+repr(layer.get("model"))+"; pick one of "+", ".join(MODELS)+".")
+        if layer["model"] == "edge_list" and "file" not in layer:
+            raise ValueError("An edge_list network layer needs a \"file\".")
+
+# build the network described by `layers` (one layer or a list of them, see the top) for `population_size` people
+def build_network(rng, population_size, layers):
+    check_layers(layers)
+    person1 = []
+    person2 = []
+    for layer in ([layers] if isinstance(layers, dict) else layers):
+        model = layer["model"]
+        if model == "households":
+            links = group_links(rng, np.arange(population_size), layer.get("size", 4))
+        elif model == "workplaces":
+            workers = rng.permutation(population_size)[:int(layer.get("employed", 1.0)*population_size)]
+            links = group_links(rng, workers, layer.get("size", 20))
+        elif model == "watts_strogatz":
+            links = watts_strogatz_links(rng, population_size, layer.get("k", 4), layer.get("p", 0.1))
+        elif model == "barabasi_albert":
+            links = barabasi_albert_links(rng, population_size, layer.get("m", 2))
+        else:
+            links = read_links(layer["file"], population_size)
+        person1.append(links[0])
+        person2.append(links[1])
+    return ContactNetwork.from_edges(population_size, np.concatenate(person1), np.concatenate(person2))
+
+# split `members` at random into groups of 1 + Poisson(size - 1) people, everyone in a group linked to
+#       everyone else in it. Returns the links as two arrays.
+def group_links(rng, members, size):
+    members = rng.permutation(members)
+    # draw enough group sizes to cover everyone; the last group is cut short
+    sizes = 1 + rng.poisson(max(size-1, 0), size=len(members)//max(int(size), 1)+1)
+    while sizes.sum() < len(members):
+        sizes = np.concatenate((sizes, 1 + rng.poisson(max(size-1, 0), size=len(sizes))))
+    group = np.repeat(np.arange(len(sizes)), sizes)[:len(members)]
+    # members of a group sit next to each other, so each one is linked to the ones 1, 2, ... places after it
+    #       for as long as they are still in the same group
+    person1 = []
+    person2 = []
+    for offset in range(1, int(sizes.max())):
+        same = np.flatnonzero(group[:-offset] == group[offset:])
+        if not len(same):
+            break
+        person1.append(members[same])
+        person2.append(members[same+offset])
+    if not person1:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(person1), np.concatenate(person2)
+
+# a Watts-Strogatz small world: a ring where everyone is linked to the `k // 2` people after them, and each
+#       link is moved to a random person with probability `p`. Returns the links as two arrays.
+def watts_strogatz_links(rng, population_size, k, p):
+    half = max(1, k//2)
+    person1 = np.repeat(np.arange(population_size), half)
+    person2 = (person1 + np.tile(np.arange(1, half+1), population_size)) % population_size
+    rewire = rng.random(len(person2)) < p
+    person2[rewire] = rng.integers(0, population_size, size=np.count_nonzero(rewire))
+    return person1, person2
+
+# a Barabasi-Albert network, using the Batagelj-Brandes method: link `j` goes from person `j // m` to the
+#       person at a random earlier spot of the list of every link's two ends, so people are picked in
+#       proportion to their number of links. A spot holding a link's far end is itself a copy of an earlier
+#       spot, and those copies are resolved for all links at once by following them back (pointer jumping).
+#       Returns the links as two arrays.
+def barabasi_albert_links(rng, population_size, m):
+    m = max(1, int(m))
+    link = np.arange(population_size*m)
+    spot = (rng.random(len(link))*(2*link+1)).astype(np.int64)
+    # an even spot is the near end of link spot // 2, which is person spot // 2 // m
+    resolved = spot % 2 == 0
+    target = np.where(resolved, spot//2//m, -1)
+    # an odd spot is the far end of link spot // 2, whose target is the one to copy
+    parent = spot//2
+    while not resolved.all():
+        waiting = np.flatnonzero(~resolved)
+        ready = resolved[parent[waiting]]
+        done = waiting[ready]
+        target[done] = target[parent[done]]
+        resolved[done] = True
+        waiting = waiting[~ready]
+        parent[waiting] = parent[parent[waiting]]
+    return link//m, target
+
+# read "person1 person2" lines (like the ones `export_graph` writes). Returns the links as two arrays.
+def read_links(path, population_size):
+    links = np.loadtxt(path, usecols=(0, 1), dtype=np.int64, ndmin=2)
+    if len(links) and (links.min() < 0 or links.max() >= population_size):
+        raise ValueError("The edge list "+path+" names people outside the population of "+str(population_size)+".")
+    return links[:, 0], links[:, 1]
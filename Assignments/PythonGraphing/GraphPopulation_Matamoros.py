@@ -0,0 +1,53 @@
+# Cellular Automata Program 2 - Population Store
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module keeps everyone in the population in three flat NumPy arrays instead of one attribute
+#       dictionary per NetworkX node. Person `i` is index `i` of every array, just like node `i` of the graph.
+
+import numpy as np
+
+# state codes stored in the "state" array. They replace the five boolean flags each node used to carry.
+SUSCEPTIBLE = 0
+LATENT = 1
+INFECTIOUS = 2
+RECOVERED = 3
+IMMUNE = 4
+
+# create the population arrays. The first `init_infected` people start infectious, the next `num_immune`
+#       are immune, and everyone else is susceptible, the same order the nodes used to be added in.
+#       "state"         -> one of the state codes above (uint8)
+#       "days_in_state" -> days spent in the current latent or infectious stage (uint16)
+#       "num_contacts"  -> number of contacts made over the whole simulation (uint32)
+def new_population(population_size, init_infected, num_immune):
+    state = np.full(population_size, SUSCEPTIBLE, dtype=np.uint8)
+    state[:init_infected] = INFECTIOUS
+    state[init_infected:init_infected+num_immune] = IMMUNE
+    return {
+        "state": state,
+        "days_in_state": np.zeros(population_size, dtype=np.uint16),
+        "num_contacts": np.zeros(population_size, dtype=np.uint32),
+    }
+
+# move everyone through the latent and infectious stages for one day. People who have been latent for the
+#       latent period become infectious, people who have been infectious for the infectious period recover,
+#       and everyone else in those two stages spends one more day there.
+#       Returns how many people became infectious and how many recovered.
+def progress(population, latent_period, infectious_period):
+    state = population["state"]
+    days_in_state = population["days_in_state"]
+
+    latent = state == LATENT
+    infectious = state == INFECTIOUS
+    newly_infectious = latent & (days_in_state >= latent_period)
+    newly_recovered = infectious & (days_in_state >= infectious_period)
+
+    # people staying in their stage spend one more day there
+    days_in_state += (latent | infectious) & ~(newly_infectious | newly_recovered)
+    # the latent-to-infectious clock restarts; recovered people keep theirs since they aren't processed anymore
+    days_in_state[newly_infectious] = 0
+    state[newly_infectious] = INFECTIOUS
+    state[newly_recovered] = RECOVERED
+
+    return int(np.count_nonzero(newly_infectious)), int(np.count_nonzero(newly_recovered))
@@ -9,9 +9,33 @@
 
 import networkx as nx
 import json
+import os
 import sys
 import random
 import matplotlib.pyplot as plt
+import numpy as np
+import GraphPopulation_Matamoros as pop
+import GraphContacts_Matamoros as contacts
+import GraphKernel_Matamoros as kernel
+import GraphNetwork_Matamoros as network
+
+# the output layer shared with the CA model lives in `../SimTools`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "SimTools"))
+import SIMoutput_Matamoros as output
+import SIMtrace_Matamoros as trace
+import SIMprofile_Matamoros as profiling
+import SIMcheckpoint_Matamoros as checkpoints
+import SIMrender_Matamoros as render
+
+# version of the simulation's behaviour. Saved results (see `../SimTools`) are only reused for the same
+#       version, so bump it whenever a change makes the same params and seed give different numbers.
+ENGINE_VERSION = "1"
+
+# the columns of the daily report
+REPORT_COLUMNS = ("day", "infections", "immune", "susceptible", "latent", "infectious", "recovered")
+
+# the ways each day's contacts can be made (see the README)
+CONTACT_MODES = ("sequential", "batched", "kernel", "network")
 
 # loads the .json file into a dictionary
 def load_json(infile):
@@ -20,216 +44,510 @@ def load_json(infile):
         dictionary_json = json.loads(data)
     return dictionary_json
 
-# randomly selects two distinct individuals by their ID's 
-def rando_persons(population_size):
-    person1 = random.randint(0,population_size)
-    person2 = random.randint(0,population_size)
+# randomly selects two distinct individuals by their ID's, using `rng` (a `random.Random`, or the `random`
+#       module itself) for the random numbers
+def rando_persons(population_size, rng=random):
+    person1 = rng.randint(0,population_size)
+    person2 = rng.randint(0,population_size)
     if person1 != person2:
         return person1, person2
     # if the two people are the same (we don't want that), run this function again
-    return rando_persons(population_size)
+    return rando_persons(population_size, rng)
 
 # if a random number between 0.0 and 1.0 is larger than the transmission rate (TR),
 #       return True. An individual is getting infected.
-def attempt_infection(transmission_rate):
-    if random.random() > transmission_rate:
+def attempt_infection(transmission_rate, rng=random):
+    if rng.random() > transmission_rate:
         return True
     else:
         return False
 
+# make the day's contacts one pair at a time, adding each contact to the graph and rolling for an
+#       infection right away. Returns the number of people who became latent, and the number of
+#       infections counted in the daily report.
+def sequential_contacts(py_rng, SimGraph, population, N, CP, TR, profiler):
+    state = population["state"]
+    num_contacts = population["num_contacts"]
+    new_latent = 0
+    daily_infections = 0
+    # counted here and handed to the profiler once at the end of the day
+    new_edges = 0
+    attempts = 0
+    # this loops until we hit the total number of contacts allowed per day
+    # We loop 2 contacts at a time because whenever, say, person1 has contact with
+    # person2, person2 has contacted person1. A net count of two contacts. Make sense? Cool.
+    for _ in range(0,CP,2):
+        # pick two random people to have close contact
+        person1, person2 = rando_persons(N - 1, py_rng)
+        # increment each person's contact count by one
+        num_contacts[person1] += 1
+        num_contacts[person2] += 1
+
+        # create an edge between them if it doesn't exist
+        if not SimGraph.has_edge(person1,person2):
+            SimGraph.add_weighted_edges_from([(person1,person2,1)])
+            new_edges += 1
+        # if the edge already exists, increase its weight by one
+        else:
+            SimGraph.edges[person1,person2]["weight"] += 1
+
+        # INFECTING SECTION
+        # if person1 is infectious while person2 isn't
+        if state[person1] == pop.INFECTIOUS and state[person2] == pop.SUSCEPTIBLE:
+            attempts += 1
+            # if the individual is getting infected, we update their state;
+            #       if they don't get infected, leave everything as is
+            if attempt_infection(TR, py_rng):
+                state[person2] = pop.LATENT
+                new_latent += 1
+                daily_infections += 1
+        # if person 2 is infectious while person 1 isn't
+        elif state[person2] == pop.INFECTIOUS and state[person1] == pop.SUSCEPTIBLE:
+            attempts += 1
+            # if the individual is getting infected, we update their state;
+            #       if they don't get infected, leave everything as is
+            if attempt_infection(TR, py_rng):
+                state[person1] = pop.LATENT
+                new_latent += 1
+    profiler.count("new_edges", new_edges)
+    profiler.count("edge_increments", len(range(0,CP,2)) - new_edges)
+    profiler.count("infection_attempts", attempts)
+    return new_latent, daily_infections
+
+# make the day's contacts in one batch with `GraphContacts_Matamoros.py`: draw every pair at once, add them
+#       to the contact matrix, and infect everyone reached by at least one successful contact.
+#       Returns the number of people who became latent, and the number of infections counted in the daily report.
+def batched_contacts(rng, contact_matrix, population, N, CP, TR, profiler):
+    state = population["state"]
+    # one pair for every two contacts allowed, the same number of pairs as the sequential loop makes
+    with profiler.phase("draw"):
+        person1, person2 = contacts.draw_contact_pairs(rng, N, len(range(0,CP,2)))
+    with profiler.phase("edges"):
+        contacts.count_contacts(population["num_contacts"], person1, person2)
+        contact_matrix.add(person1, person2)
+    with profiler.phase("infections"):
+        targets, sources, attempts = contacts.attempt_infections(rng, state, person1, person2, TR)
+        targets, sources = contacts.resolve_infections(targets, sources)
+        state[targets] = pop.LATENT
+    profiler.count("infection_attempts", attempts)
+    return len(targets), len(targets)
+
+# make the day's contacts one at a time, in the same order and with the same rules as `sequential_contacts`,
+#       with the loop in `GraphKernel_Matamoros.py` (compiled by Numba when it's installed), then add the
+#       day's pairs to the contact matrix in one go.
+#       Returns the number of people who became latent, and the number of infections counted in the daily report.
+def kernel_contacts(contact_kernel, contact_matrix, population, TR, profiler):
+    with profiler.phase("kernel"):
+        new_latent, daily_infections, attempts = contact_kernel.day(population, TR)
+    with profiler.phase("edges"):
+        contact_matrix.add(contact_kernel.person1, contact_kernel.person2)
+    profiler.count("infection_attempts", attempts)
+    return new_latent, daily_infections
+
+# make the day's contacts on the fixed contact network (see `GraphNetwork_Matamoros.py`): every infectious
+#       person contacts about `C` of their neighbours, and everyone reached by at least one successful contact
+#       is infected, like in `batched_contacts`. Nobody else makes contacts, since they couldn't infect anyone.
+#       Returns the number of people who became latent, the number of infections counted in the daily report,
+#       and the number of contacts made.
+def network_contacts(rng, contact_network, contact_matrix, population, C, TR, profiler):
+    state = population["state"]
+    with profiler.phase("draw"):
+        person1, person2 = contact_network.draw_contacts(rng, np.flatnonzero(state == pop.INFECTIOUS), C)
+    with profiler.phase("edges"):
+        contacts.count_contacts(population["num_contacts"], person1, person2)
+        contact_matrix.add(person1, person2)
+    with profiler.phase("infections"):
+        targets, sources, attempts = contacts.attempt_infections(rng, state, person1, person2, TR)
+        targets, sources = contacts.resolve_infections(targets, sources)
+        state[targets] = pop.LATENT
+    profiler.count("infection_attempts", attempts)
+    return len(targets), len(targets), len(person1)*2
+
 def main():
     # grab the user's parameters from `PARAMS.json` and apply them to the project
     PARAMS = load_json(sys.argv[1])
+    try:
+        check_params(PARAMS)
+    except ValueError as error:
+        print(error)
+        return
+    # progress lines and state snapshots go through the tracer picked by `verbosity` (see `../SimTools/SIMtrace_Matamoros.py`)
+    tracer = trace.from_params(PARAMS, "contacts")
+    # per-phase timers and counters, and optionally cProfile or a sampling profiler, if `profile` is set
+    #       (see `../SimTools/SIMprofile_Matamoros.py`)
+    profiler = profiling.from_params(PARAMS)
+    profiler.start()
+    # pick up an earlier run from its checkpoint if `resume_file` is set, or start a new one. A resumed run
+    #       keeps the params and seed it was started with.
+    if PARAMS.get("resume_file"):
+        simulation = Simulation.resume(PARAMS["resume_file"], tracer, profiler)
+    else:
+        simulation = Simulation(PARAMS, PARAMS.get("seed"), tracer, profiler)
+    # the daily numbers go to `output_file` (or a list of files): a `.npz` or `.parquet` file gets the
+    #       compressed columnar format from `../SimTools/SIMoutput_Matamoros.py`, anything else gets the text report
+    metadata = {"model": "graph", "params": simulation.PARAMS, "seed": simulation.seed, "engine_version": ENGINE_VERSION}
+    with output.open_sinks(PARAMS.get("output_file", "output.txt"), REPORT_COLUMNS, metadata, TextSink) as sink:
+        # run to the end, saving a checkpoint to `checkpoint_file` every `checkpoint_every` days if it's set
+        checkpoints.run_to_end(simulation, PARAMS)
+        simulation.finish(sink)
+    profiler.stop()
+    tracer.close()
+    profiler.write(PARAMS.get("profile_file", "profile.json"))
 
-    # safe-guards
+# safe-guards: raise a ValueError if the params describe a simulation that can't be run
+def check_params(PARAMS):
+    # If there's nobody to make a contact with: every contact is between two different people
+    if PARAMS["population"] < 2:
+        raise ValueError("The population must have at least 2 people, so that contacts can be made. Raise it, and restart the program.")
     # If there are: E.G. 110 initially infected people when the population is 100
     if PARAMS["init_infected"] > PARAMS["population"]:
-        print("The number of initially infected people is greater than the population size. Lower it, and restart the program.")
+        raise ValueError("The number of initially infected people is greater than the population size. Lower it, and restart the program.")
     # If there are: E.G. 50 initially infected people in a population of 100 people, where 60 people are already immune
-    elif (PARAMS["immune_perc"]*PARAMS["population"])+PARAMS["init_infected"] > PARAMS["population"]:
-        print("The sum of initially infected and immune people is larger than the population. Lower one or the other, and restart the program.")
-    else:
+    if (PARAMS["immune_perc"]*PARAMS["population"])+PARAMS["init_infected"] > PARAMS["population"]:
+        raise ValueError("The sum of initially infected and immune people is larger than the population. Lower one or the other, and restart the program.")
+    # If the contacts are to be made in a way that doesn't exist (a typo would otherwise run the sequential
+    #       loop but save, export, and draw the unused contact matrix)
+    if PARAMS.get("contact_mode", "sequential") not in CONTACT_MODES:
+        raise ValueError("Unknown contact_mode "+repr(PARAMS["contact_mode"])+"; pick one of "+", ".join(CONTACT_MODES)+".")
+    # If the contact network is made of models that don't exist
+    if PARAMS.get("contact_mode") == "network":
+        network.check_layers(PARAMS.get("network", network.DEFAULT_LAYERS))
+    # If the graph is to be drawn with a layout that doesn't exist, say so now rather than after the run
+    if PARAMS.get("graph_layout", "spring") not in render.LAYOUTS:
+        raise ValueError("Unknown graph_layout "+repr(PARAMS["graph_layout"])+"; pick one of "+", ".join(render.LAYOUTS)+".")
+
+# run one realization of the simulation described by `PARAMS` (the dictionary `load_json` returns).
+#       `seed` makes the run repeatable. If a `sink` is given, every day's numbers (see `REPORT_COLUMNS`)
+#       and everyone's contact count are written to it, and if a `tracer` is given, it is told about every
+#       day and gets a snapshot of everyone's state (as a single-row frame) when it asks for one. A `profiler`
+#       (see `../SimTools/SIMprofile_Matamoros.py`) times each stage of the day and counts the work done.
+#       Returns an array with one row per day holding the number of susceptible, latent, infectious,
+#       and recovered people at the end of that day.
+def simulate(PARAMS, seed=None, sink=None, tracer=None, profiler=None):
+    simulation = Simulation(PARAMS, seed, tracer, profiler)
+    for day, counts in simulation.run():
+        pass
+    return simulation.finish(sink)
+
+# One realization of the simulation described by `PARAMS`, simulated one day at a time (see `simulate` for
+#       the arguments). `step()` simulates the next day and returns its number and its {"S", "L", "I", "R"}
+#       counts, and `run(days)` is a generator that does the same for every day until the outbreak ends (or
+#       for at most `days` days), so a caller can watch a run as it goes or stop it early. `checkpoint(path)`
+#       saves the whole run: the population arrays, the graph or contact matrix, the contact network, and the
+#       state of every random number generator (see `../SimTools/SIMcheckpoint_Matamoros.py`), and
+#       `Simulation.resume(path)` carries on from it exactly as if it had never stopped. `finish(sink)` writes
+#       the output, draws or exports the graph, and returns the daily counts like `simulate` does.
+class Simulation:
+    def __init__(self, PARAMS, seed=None, tracer=None, profiler=None, checkpoint=None):
+        check_params(PARAMS)
+        if tracer is None:
+            tracer = trace.Tracer(trace.SILENT)
+        if profiler is None:
+            profiler = profiling.NullProfiler()
+        self.PARAMS = PARAMS
+        self.seed = seed
+        self.tracer = tracer
+        self.profiler = profiler
+
         # population size
-        N = PARAMS["population"]
+        self.N = N = PARAMS["population"]
         # average number of contacts per person, per day;
-        C = PARAMS["num_contacts"]
+        self.C = C = PARAMS["num_contacts"]
         # number of contacts allowed in entire population per day 
-        CP = C * N
+        self.CP = CP = C * N
         # transmission rate
-        TR = PARAMS["trans_rate"]
+        self.TR = PARAMS["trans_rate"]
         # number of initially infected people
         II = PARAMS["init_infected"]
         # days latent
-        DL = PARAMS["latent_period"]
+        self.DL = PARAMS["latent_period"]
         # days infectious
-        DI = PARAMS["infectious_period"]
+        self.DI = PARAMS["infectious_period"]
         # percent and number of immune people, respectively - these people may have natural immunity or may have been vaccinated
         PI = PARAMS["immune_perc"]
-        NI = int(PI * N)
-        # shows a graph of the final state of the model (number of remaining susceptibles, removed, and immune people)
-        GRAPH = PARAMS["show_graph"]
-
-        # Graph of the disease spread
-        SimGraph = nx.Graph()
-
-        # number used to give people a unique identifier
-        iden = 0
-
-        # current number of susceptible people
-        current_susceptible = N - II - NI
-
-        # current number of infectious people
-        current_infectious = II
-
-        # current number people in the latent stage
-        current_latent = 0
-
-        # current number of recovered people
-        current_recovered = 0
-
-        # number of people infected on any day
-        daily_infections = 0
-        # simulation day
-        day = 0
-
-        # populate the graph with enough nodes to represent the population
-        # Add the initially infected people first
-        for _ in range(II):
-            SimGraph.add_node(iden,attributes={"immune":False,"susceptible":False,"latent":False,"infectious":True,"recovered":False,"days_in_state":0,"num_contacts":0})
-            iden += 1
-
-        # Add the number of immune
-        for _ in range(NI):
-            SimGraph.add_node(iden,attributes={"immune":True,"susceptible":False,"latent":False,"infectious":False,"recovered":False,"days_in_state":0,"num_contacts":0})
-            iden += 1
-
-        # Add the rest of the population as susceptible
-        for x in range(iden,N):
-            SimGraph.add_node(x,attributes={"immune":False,"susceptible":True,"latent":False,"infectious":False,"recovered":False,"days_in_state":0,"num_contacts":0})
-        
-        # open the output file to which we will write the daily numbers and contact count of each
-        #       person at the end of the simulation
-        with open("output.txt",'w') as w:
-            # main simulation loop, where we continue the simulation until there are no more infectious
-            #       nor latent people
-            while current_infectious or current_latent:
-                # this loops until we hit the total number of contacts allowed per day
-                # We loop 2 contacts at a time because whenever, say, person1 has contact with
-                # person2, person2 has contacted person1. A net count of two contacts. Make sense? Cool.
-                for _ in range(0,CP,2):
-                    # pick two random people to have close contact
-                    person1, person2 = rando_persons(N - 1)
-                    # increment each person's contact count by one
-                    SimGraph.nodes[person1]["attributes"]["num_contacts"] += 1
-                    SimGraph.nodes[person2]["attributes"]["num_contacts"] += 1
-
-                    # create an edge between them if it doesn't exist
-                    if not SimGraph.has_edge(person1,person2):
-                        SimGraph.add_weighted_edges_from([(person1,person2,1)])
-                    # if the edge already exists, increase its weight by one
-                    else:
-                        SimGraph.edges[person1,person2]["weight"] += 1
-
-                    # INFECTING SECTION
-                    # if person1 is infectious while person2 isn't
-                    if SimGraph.nodes[person1]["attributes"]["infectious"] and SimGraph.nodes[person2]["attributes"]["susceptible"]:
-                        # if the individual is getting infected, we update their node;
-                        #       if they don't get infected, leave everything as is
-                        if attempt_infection(TR):
-                            SimGraph.nodes[person2]["attributes"]["latent"] = True
-                            SimGraph.nodes[person2]["attributes"]["susceptible"] = False
-                            current_latent += 1
-                            current_susceptible -= 1
-                            daily_infections += 1
-                    # if person 2 is infectious while person 1 isn't
-                    elif SimGraph.nodes[person2]["attributes"]["infectious"] and SimGraph.nodes[person1]["attributes"]["susceptible"]:
-                        # if the individual is getting infected, we update their node;
-                        #       if they don't get infected, leave everything as is
-                        if attempt_infection(TR):
-                            SimGraph.nodes[person1]["attributes"]["latent"] = True
-                            SimGraph.nodes[person1]["attributes"]["susceptible"] = False
-                            current_latent += 1
-                            current_susceptible -= 1
-
-                # loop through the entire population and handle each person's state
-                #       increasing days latent or infectious by one if they haven't
-                #       been in that state for the entire latent or infectious period.
-                #       Also, we move people who have stayed the duration of each period
-                #       to the next state.
-                for node in range(N):
-                    # ADJUSTING PEOPLE'S TIME IN LATENT STAGE
-                    # if person is in the latent stage
-                    if SimGraph.nodes[node]["attributes"]["latent"]:
-                        # if they've been in the latent stage for less than the disease's latent period
-                        if SimGraph.nodes[node]["attributes"]["days_in_state"] < DL:
-                            SimGraph.nodes[node]["attributes"]["days_in_state"] += 1
-                        # if they have, progress them to the next stage
-                        else:
-                            SimGraph.nodes[node]["attributes"]["latent"] = False
-                            SimGraph.nodes[node]["attributes"]["infectious"] = True
-                            current_infectious += 1
-                            current_latent -= 1
-                            SimGraph.nodes[node]["attributes"]["days_in_state"] = 0
-                    
-                    # ADJUSTING PEOPLE'S TIME IN INFECTIOUS STAGE
-                    # if person is in the infectious stage
-                    elif SimGraph.nodes[node]["attributes"]["infectious"]:
-                        # if they've been in the infectious stage for less than the disease's infectious period
-                        if SimGraph.nodes[node]["attributes"]["days_in_state"] < DI:
-                            SimGraph.nodes[node]["attributes"]["days_in_state"] += 1
-                        # if they have, progress them to the next stage
-                        else:
-                            SimGraph.nodes[node]["attributes"]["infectious"] = False
-                            SimGraph.nodes[node]["attributes"]["recovered"] = True
-                            current_recovered += 1
-                            current_infectious -= 1
-                            # we don't reset SimGraph.nodes[node]["attributes"]["days_in_state"] since recovered people
-                            #       aren't processed in the simulation anymore.
-
-                # print off the number of people in each state at the end of the day
-                w.write("Day "+str(day)+'\n')
-                w.write("Num infections: "+str(daily_infections)+'\n')
-                w.write("Num immune: "+str(NI)+'\n')
-                w.write("Num susceptible: "+str(current_susceptible)+'\n')
-                w.write("Num latent: "+str(current_latent)+'\n')
-                w.write("Num infectious: "+str(current_infectious)+'\n')
-                w.write("Num recovered: "+str(current_recovered)+'\n')
-                w.write('-------------------------------\n')
-                # print the day to the terminal to prove the program is still executing
-                print("Day:",day)
-                # move on to the next day
-                day += 1
-                daily_infections = 0
-            
-            # loop through all nodes in the graph and print each person's ID and their contact count
-            for (u, d) in SimGraph.nodes(data=True):
-                w.write("Person "+str(u)+" was contacted "+str(d["attributes"]["num_contacts"])+" times.\n")
-
-        # if the user wants to see the final model's state, draw to Matplotlib
-        if GRAPH:
-            # here we add the nodes of people who are either susceptible, recovered, and immune to their own list.
-            #       That way, we can apply a color to each node type.
-            susceptible = []
-            recovered = []
-            immune = []
-            for (_, d) in SimGraph.nodes(data=True):
-                if d["attributes"]["susceptible"]:
-                    susceptible.append(u)
-                elif d["attributes"]["recovered"]:
-                    recovered.append(u)
+        self.NI = NI = int(PI * N)
+
+        # how contacts are made each day: "sequential" makes them one at a time and adds each to the graph,
+        #       "batched" makes the whole day's contacts at once and sums them into a sparse contact matrix,
+        #       "kernel" makes them one at a time in a compiled loop and sums them into the contact matrix, and
+        #       "network" only lets infectious people contact their neighbours on a fixed contact network
+        self.CONTACT_MODE = CONTACT_MODE = PARAMS.get("contact_mode", "sequential")
+
+        # the random number generators, seeded so a run is repeatable. Sequential contacts use Python's
+        #       `random`, batched contacts use NumPy's.
+        self.py_rng = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+
+        # Graph of the disease spread. In batched and kernel mode, contacts are kept in `contact_matrix` instead
+        #       and the graph is only built at the end if it's going to be drawn or exported.
+        self.SimGraph = nx.Graph()
+        self.contact_matrix = contacts.ContactMatrix(N)
+        self.contact_kernel = None
+        self.contact_network = None
+
+        if checkpoint is None:
+            # current number of susceptible people
+            self.current_susceptible = N - II - NI
+
+            # current number of infectious people
+            self.current_infectious = II
+
+            # current number people in the latent stage
+            self.current_latent = 0
+
+            # current number of recovered people
+            self.current_recovered = 0
+
+            # number of people infected on each day, and the number of people in each state at the end of each day
+            self.infections = []
+            self.series = []
+
+            # populate the graph with enough nodes to represent the population. Each person's state, days in
+            #       that state, and contact count live in the population arrays, indexed by the person's node ID.
+            #       The initially infected people come first, then the immune, then the rest as susceptible.
+            with profiler.phase("setup"):
+                if CONTACT_MODE == "sequential":
+                    self.SimGraph.add_nodes_from(range(N))
+                self.population = pop.new_population(N, II, NI)
+                # the fixed contact network is built once, from the `network` layers
+                if CONTACT_MODE == "network":
+                    self.contact_network = network.build_network(self.rng, N, PARAMS.get("network", network.DEFAULT_LAYERS))
+        else:
+            # carry on from a checkpoint: the counts, population, contacts, and days so far are all saved in it
+            state, arrays = checkpoint
+            self.current_susceptible, self.current_latent, self.current_infectious, self.current_recovered = state["counts"]
+            self.infections = arrays["infections"].tolist()
+            self.series = [tuple(row) for row in arrays["series"].tolist()]
+            version, internal_state, gauss_next = state["py_rng"]
+            self.py_rng.setstate((version, tuple(internal_state), gauss_next))
+            self.rng.bit_generator.state = state["rng"]
+            with profiler.phase("setup"):
+                self.population = {name: arrays["population_"+name] for name in ("state", "days_in_state", "num_contacts")}
+                if CONTACT_MODE == "sequential":
+                    # adding the edges back in the order the graph lists them keeps that order
+                    self.SimGraph.add_nodes_from(range(N))
+                    self.SimGraph.add_weighted_edges_from(zip(arrays["graph_person1"].tolist(), arrays["graph_person2"].tolist(), arrays["graph_weight"].tolist()))
                 else:
-                    immune.append(u)
-
-            # Draw the graph
-            pos = nx.circles_layout(SimGraph)
-            nx.draw_networkx_nodes(SimGraph, pos, nodelist=susceptible, node_color='#14de4a')
-            nx.draw_networkx_nodes(SimGraph, pos, nodelist=recovered, node_color='#0000ff')
-            nx.draw_networkx_nodes(SimGraph, pos, nodelist=immune, node_color='#ba8722')
-            nx.draw_networkx_labels(SimGraph, pos)
-            nx.draw_networkx_edges(SimGraph, pos, width=0.25, arrowsize=1)
-            # nx.draw_networkx_edge_labels(SimGraph, pos, font_size=4) # this slows the program down a LOT for large populations
-            plt.title("SLIR simulation over "+str(day)+" days")
-            plt.show()
+                    self.contact_matrix.load(arrays["contacts_data"], arrays["contacts_indices"], arrays["contacts_indptr"])
+                if CONTACT_MODE == "network":
+                    self.contact_network = network.ContactNetwork(arrays["network_indptr"], arrays["network_indices"])
+
+        # the kernel keeps its own generator state and pair buffers, and is compiled here rather than on day one
+        if CONTACT_MODE == "kernel":
+            with profiler.phase("setup"):
+                self.contact_kernel = kernel.ContactKernel(len(range(0,CP,2)), seed)
+                if checkpoint is not None:
+                    self.contact_kernel.rng_state[0] = state["kernel_rng"]
+                self.contact_kernel.warm_up(self.population)
+
+        tracer.begin()
+
+    # read a checkpoint saved by `checkpoint` and carry on from it
+    @classmethod
+    def resume(cls, path, tracer=None, profiler=None):
+        state, arrays = checkpoints.load_checkpoint(path, "graph", ENGINE_VERSION)
+        return cls(state["params"], state["seed"], tracer, profiler, checkpoint=(state, arrays))
+
+    # True once there are no more infectious nor latent people
+    @property
+    def done(self):
+        return not (self.current_infectious or self.current_latent)
+
+    # simulate the next day. Returns the day's number and its end-of-day counts.
+    def step(self):
+        if self.done:
+            raise RuntimeError("The outbreak is over; there are no days left to simulate.")
+        N, CP, TR = self.N, self.CP, self.TR
+        population = self.population
+        profiler = self.profiler
+
+        # make the day's contacts, either one at a time or all at once. Every mode but "network" makes the same
+        #       number of contacts every day.
+        num_made = len(range(0,CP,2))*2
+        if self.CONTACT_MODE == "batched":
+            new_latent, daily_infections = batched_contacts(self.rng, self.contact_matrix, population, N, CP, TR, profiler)
+        elif self.CONTACT_MODE == "kernel":
+            new_latent, daily_infections = kernel_contacts(self.contact_kernel, self.contact_matrix, population, TR, profiler)
+        elif self.CONTACT_MODE == "network":
+            new_latent, daily_infections, num_made = network_contacts(self.rng, self.contact_network, self.contact_matrix, population, self.C, TR, profiler)
+        else:
+            with profiler.phase("contacts"):
+                new_latent, daily_infections = sequential_contacts(self.py_rng, self.SimGraph, population, N, CP, TR, profiler)
+        profiler.count("contacts", num_made)
+        profiler.count("infections", new_latent)
+        self.current_latent += new_latent
+        self.current_susceptible -= new_latent
+
+        # move everyone in the latent or infectious stage one day along, progressing people who have
+        #       stayed the duration of each period to the next state, all at once
+        with profiler.phase("progress"):
+            new_infectious, new_recovered = pop.progress(population, self.DL, self.DI)
+        self.current_latent -= new_infectious
+        self.current_infectious += new_infectious - new_recovered
+        self.current_recovered += new_recovered
+
+        # keep the number of people in each state at the end of the day
+        self.infections.append(daily_infections)
+        self.series.append((self.current_susceptible, self.current_latent, self.current_infectious, self.current_recovered))
+        counts = {"S": self.current_susceptible, "L": self.current_latent, "I": self.current_infectious, "R": self.current_recovered}
+        # report the day to the tracer to prove the program is still executing
+        with profiler.phase("report"):
+            self.tracer.day(len(self.series)-1, counts, num_made)
+            if self.tracer.snapshots:
+                self.tracer.snapshot(population["state"].reshape(1, N))
+        return len(self.series)-1, counts
+
+    # simulate up to `days` more days (every day until the outbreak ends if `days` is None), giving each
+    #       day's number and counts as it finishes
+    def run(self, days=None):
+        simulated = 0
+        while not self.done and (days is None or simulated < days):
+            yield self.step()
+            simulated += 1
+
+    # save the whole run to `path` so `Simulation.resume(path)` can carry on from today
+    def checkpoint(self, path):
+        arrays = {"population_"+name: values for name, values in self.population.items()}
+        arrays["series"] = np.array(self.series, dtype=np.int64).reshape(-1, 4)
+        arrays["infections"] = np.array(self.infections, dtype=np.int64)
+        if self.CONTACT_MODE == "sequential":
+            edges = list(self.SimGraph.edges(data="weight"))
+            arrays["graph_person1"] = np.array([edge[0] for edge in edges], dtype=np.int64)
+            arrays["graph_person2"] = np.array([edge[1] for edge in edges], dtype=np.int64)
+            arrays["graph_weight"] = np.array([edge[2] for edge in edges], dtype=np.int64)
+        else:
+            matrix = self.contact_matrix.tocsr()
+            arrays.update(contacts_data=matrix.data, contacts_indices=matrix.indices, contacts_indptr=matrix.indptr)
+        if self.contact_network is not None:
+            arrays.update(network_indptr=self.contact_network.indptr, network_indices=self.contact_network.indices)
+        state = {
+            "params": self.PARAMS,
+            "seed": self.seed,
+            "counts": [self.current_susceptible, self.current_latent, self.current_infectious, self.current_recovered],
+            "py_rng": self.py_rng.getstate(),
+            "rng": self.rng.bit_generator.state,
+        }
+        if self.contact_kernel is not None:
+            state["kernel_rng"] = int(self.contact_kernel.rng_state[0])
+        checkpoints.save_checkpoint(path, "graph", ENGINE_VERSION, state, arrays)
+
+    # send the daily numbers and contact count of each person to the output sink, and draw or export the
+    #       graph if the params ask for it. Returns an array with one row per day holding the number of
+    #       susceptible, latent, infectious, and recovered people at the end of that day.
+    def finish(self, sink=None):
+        # shows a sample of the final graph, coloured by everyone's final state (susceptible, recovered, and immune)
+        GRAPH = self.PARAMS.get("show_graph", False)
+        # optional file to write the final graph to as a weighted edge list
+        EXPORT = self.PARAMS.get("export_graph")
+        # optional image files for the compartment curves, the histogram of everyone's number of contacts,
+        #       and a sample of the final graph (`graph_sample` people, 1000 by default, placed with the
+        #       `graph_layout`, "spring" or "circular")
+        PLOT = self.PARAMS.get("plot_file")
+        DEGREE_PLOT = self.PARAMS.get("degree_plot_file")
+        GRAPH_IMAGE = self.PARAMS.get("graph_image")
+        SAMPLE = self.PARAMS.get("graph_sample", 1000)
+        LAYOUT = self.PARAMS.get("graph_layout", "spring")
+        series = np.array(self.series, dtype=np.int64).reshape(-1, 4)
+
+        # the contact matrix sums its contacts in bulk, so it only knows which of them made new edges once
+        #       the pending ones are summed (the sequential loop counts them as it goes)
+        if self.CONTACT_MODE != "sequential":
+            with self.profiler.phase("edges"):
+                self.contact_matrix.flush()
+            self.profiler.count("new_edges", self.contact_matrix.new_edges)
+            self.profiler.count("edge_increments", self.contact_matrix.edge_increments)
+
+        with self.profiler.phase("output"):
+            if sink is not None:
+                for day, row in enumerate(self.series):
+                    sink.write_day((day, self.infections[day], self.NI)+row)
+                sink.write_people("num_contacts", self.population["num_contacts"])
+
+        with self.profiler.phase("graph"):
+            # if the user wants to keep the final graph, write it out as "person1 person2 weight" lines,
+            #       building it from the contact matrix first if there is one
+            if EXPORT:
+                SimGraph = self.SimGraph
+                if self.CONTACT_MODE != "sequential":
+                    SimGraph = self.contact_matrix.to_networkx()
+                nx.write_weighted_edgelist(SimGraph, EXPORT)
+
+        # the drawings only ever look at a sample of the graph or at totals, so they take seconds even for a
+        #       million people (see `../SimTools/SIMrender_Matamoros.py`)
+        with self.profiler.phase("render"):
+            if PLOT:
+                render.plot_compartments(series, PLOT)
+            if DEGREE_PLOT or GRAPH_IMAGE or GRAPH:
+                adjacency = self.contact_adjacency()
+            if DEGREE_PLOT:
+                render.plot_degree_histogram(np.diff(adjacency.indptr), DEGREE_PLOT)
+            if GRAPH_IMAGE:
+                draw_graph(adjacency, self.population["state"], len(self.series), SAMPLE, LAYOUT, self.seed, GRAPH_IMAGE)
+            # if the user wants to see the final model's state, draw to Matplotlib
+            if GRAPH:
+                draw_graph(adjacency, self.population["state"], len(self.series), SAMPLE, LAYOUT, self.seed)
+
+        return series
+
+    # everyone's contacts over the whole run as a symmetric CSR matrix of contact weights, one row per person
+    def contact_adjacency(self):
+        if self.CONTACT_MODE == "sequential":
+            return nx.to_scipy_sparse_array(self.SimGraph, nodelist=range(self.N), format="csr")
+        matrix = self.contact_matrix.tocsr()
+        return (matrix + matrix.T).tocsr()
+
+# Writes the daily numbers (number of infections, people in the latent stage, etc.) and a list of the number
+#       of contacts each person made for the entire simulation to a text file. The file is only created once
+#       something is written to it.
+class TextSink(output.Sink):
+    def __init__(self, path):
+        self.path = path
+        self.w = None
+
+    def open(self):
+        if self.w is None:
+            self.w = open(self.path,'w')
+        return self.w
+
+    def write_day(self, row):
+        day, daily_infections, NI, current_susceptible, current_latent, current_infectious, current_recovered = row
+        w = self.open()
+        # print off the number of people in each state at the end of the day
+        w.write("Day "+str(day)+'\n')
+        w.write("Num infections: "+str(daily_infections)+'\n')
+        w.write("Num immune: "+str(NI)+'\n')
+        w.write("Num susceptible: "+str(current_susceptible)+'\n')
+        w.write("Num latent: "+str(current_latent)+'\n')
+        w.write("Num infectious: "+str(current_infectious)+'\n')
+        w.write("Num recovered: "+str(current_recovered)+'\n')
+        w.write('-------------------------------\n')
+
+    def write_people(self, name, values):
+        # loop through all nodes in the graph and print each person's ID and their contact count
+        if name == "num_contacts":
+            w = self.open()
+            for u in range(len(values)):
+                w.write("Person "+str(u)+" was contacted "+str(values[u])+" times.\n")
+
+    def close(self):
+        if self.w is not None:
+            self.w.close()
+
+# draw a sample of about `sample` people of the final contact graph (a CSR matrix like `contact_adjacency`
+#       returns) and the contacts between them, coloured by everyone's final state. The sample is a few groups
+#       of people who contacted each other, laid out once with a "spring" or "circular" `layout`. The drawing
+#       is saved to `path` if there is one, and shown in a Matplotlib window otherwise.
+def draw_graph(adjacency, state, day, sample=1000, layout="spring", seed=None, path=None):
+    nodes, edges = render.sample_subgraph(np.random.default_rng(seed), adjacency.indptr, adjacency.indices, sample)
+    positions = render.layout(len(nodes), edges, layout, seed)
+    title = "SLIR simulation over "+str(day)+" days ("+str(len(nodes))+" of "+str(len(state))+" people)"
+    if path:
+        render.draw_subgraph(positions, edges, render.node_colors(state, nodes), path, title=title)
+        return
+    # here each person is drawn in the colour of their state (susceptible green, recovered blue, immune brown)
+    figure, ax = plt.subplots(figsize=(8, 8))
+    render.draw_subgraph(positions, edges, render.node_colors(state, nodes), ax=ax, title=title)
+    plt.show()
 
 if __name__ == "__main__":
     main()
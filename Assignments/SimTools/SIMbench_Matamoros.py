@@ -0,0 +1,226 @@
+# Simulation Tools - Benchmarks
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This program times both simulators, in every engine or contact mode, on a ladder of sizes: grid sides
+#       from 10 to 5000 for the cellular automaton and populations from 100 to 1,000,000 for the graph model.
+#       Every size starts from the scenario in the model's own params file and is run with the same seed, in
+#       a fresh process, for a fixed number of days. Each case records the setup time (everything before the
+#       first day), the average wall time per simulated day, the grid cells (of the whole grid, whichever
+#       engine) or contacts handled per second, and the peak memory of the process and its workers. The
+#       results are saved as JSON, and can be checked against an earlier results file to catch any case that
+#       got slower or bigger.
+#
+#       python SIMbench_Matamoros.py [--models ca graph] [--modes M ...] [--max-size N] [--days D] [--seed S]
+#                                    [--out FILE] [--baseline FILE] [--tolerance T]
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from SIMmodels_Matamoros import ENGINE_VERSIONS, HERE, load_params, run_model
+import SIMtrace_Matamoros as trace
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where peak memory isn't measured
+    resource = None
+
+# the params file each model's scenario comes from
+BASE_PARAMS = {
+    "ca": os.path.join(HERE, "..", "CA_Project", "CAparams.json"),
+    "graph": os.path.join(HERE, "..", "PythonGraphing", "params.json"),
+}
+
+# the param that picks how each model simulates a day
+MODE_KEYS = {"ca": "engine", "graph": "contact_mode"}
+
+# the sizes (grid side or population) every mode is run at. Modes that work cell by cell or contact by
+#       contact in Python stop at smaller sizes, so the whole ladder finishes in minutes.
+LADDERS = {
+    "ca": {
+        "loop": (10, 100, 500),
+        "vectorized": (10, 100, 500, 1000, 2000, 5000),
+        "active": (10, 100, 500, 1000, 2000, 5000),
+        "tiled": (100, 500, 1000, 2000, 5000),
+    },
+    "graph": {
+        "sequential": (100, 1000, 10000, 100000),
+        "batched": (100, 1000, 10000, 100000, 1000000),
+        "kernel": (100, 1000, 10000, 100000, 1000000),
+        "network": (100, 1000, 10000, 100000, 1000000),
+    },
+}
+
+# what each model reports as its daily work
+UNITS = {"ca": "cells", "graph": "contacts"}
+
+# timing differences smaller than this many seconds (and memory differences smaller than this many MB)
+#       are noise, not regressions
+NOISE = {"setup_s": 0.05, "day_s": 0.005, "peak_rss_mb": 10.0}
+
+# raised by `BenchTracer` to stop a run once it has simulated enough days
+class DayLimit(Exception):
+    pass
+
+# A silent tracer that notes when the setup ends and when every day ends, and stops the run after `max_days`
+class BenchTracer(trace.Tracer):
+    def __init__(self, max_days):
+        super().__init__(trace.SILENT)
+        self.max_days = max_days
+        self.began = None
+        self.finished = None
+
+    def begin(self):
+        super().begin()
+        self.began = time.perf_counter()
+
+    def day(self, day, counts, work):
+        super().day(day, counts, work)
+        self.finished = time.perf_counter()
+        if self.days >= self.max_days:
+            raise DayLimit
+
+# the params of one benchmark case: the model's own scenario at the given size and mode. The CA keeps the
+#       params file's share of occupied cells as the grid grows.
+def scenario(model, mode, size):
+    params = load_params(BASE_PARAMS[model])
+    params[MODE_KEYS[model]] = mode
+    params["verbosity"] = trace.SILENT
+    if model == "ca":
+        density = params["population"] / (params["num_row"]*params["num_col"])
+        params["num_row"] = params["num_col"] = size
+        params["population"] = max(params["init_infected"], int(density*size*size))
+    else:
+        params["population"] = size
+    return params
+
+# the peak memory of the current process plus that of its largest finished child process (like the tiled
+#       engine's workers, which are joined when the run ends) in MB, or None where it can't be measured
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024*1024 if sys.platform == "darwin" else 1024)
+
+# worker-process entry point: run one case for up to `days` days and measure it
+def run_case(job):
+    model, mode, size, days, seed = job
+    params = scenario(model, mode, size)
+    tracer = BenchTracer(days)
+    start = time.perf_counter()
+    try:
+        run_model(model, params, seed, tracer)
+    except DayLimit:
+        pass
+    result = {"model": model, "mode": mode, "size": size, "days": tracer.days, "setup_s": tracer.began - start,
+              "day_s": None, "work_per_s": None, "unit": UNITS[model], "peak_rss_mb": peak_rss_mb()}
+    if tracer.days:
+        simulated = max(tracer.finished - tracer.began, 1e-9)
+        result["day_s"] = simulated / tracer.days
+        # the "active" engine only visits the cells around the outbreak, so every CA engine's throughput is
+        #       counted in cells of the whole grid to compare them like for like
+        work = tracer.days*size*size if model == "ca" else tracer.work
+        result["work_per_s"] = work / simulated
+    return result
+
+# every (model, mode, size) case to run, smallest first, optionally limited to some modes and a largest size
+def build_cases(models, modes=None, max_size=None):
+    cases = []
+    for model in models:
+        for mode, sizes in LADDERS[model].items():
+            if modes and mode not in modes:
+                continue
+            cases.extend((model, mode, size) for size in sizes if max_size is None or size <= max_size)
+    return cases
+
+# run every case one after another, each in a fresh process so its peak memory is its own and no case
+#       slows another down. `report(result)` is called as each case finishes.
+#       Returns the results file's contents as a dictionary.
+def run_benchmarks(cases, days, seed, report=None):
+    results = []
+    context = mp.get_context("spawn")
+    for model, mode, size in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, (model, mode, size, days, seed)).result()
+        results.append(result)
+        if report is not None:
+            report(result)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "numpy": np.__version__, "cpu_count": os.cpu_count()},
+        "engine_versions": ENGINE_VERSIONS,
+        "days": days,
+        "seed": seed,
+        "results": results,
+    }
+
+# match every case to the same case in a baseline results file and list the ones whose setup time, time per
+#       day, or peak memory grew by more than `tolerance` (0.2 = 20%).
+#       Returns (model, mode, size, metric, baseline value, new value) for every regression.
+def compare(results, baseline, tolerance):
+    before = {(old["model"], old["mode"], old["size"]): old for old in baseline["results"]}
+    regressions = []
+    for new in results["results"]:
+        old = before.get((new["model"], new["mode"], new["size"]))
+        if old is None:
+            continue
+        for metric, noise in NOISE.items():
+            if new[metric] is None or old.get(metric) is None:
+                continue
+            if new[metric] > old[metric]*(1+tolerance) and new[metric] - old[metric] > noise:
+                regressions.append((new["model"], new["mode"], new["size"], metric, old[metric], new[metric]))
+    return regressions
+
+# one line of the results table
+def format_result(result):
+    line = result["model"].ljust(6)+result["mode"].ljust(12)+str(result["size"]).rjust(9)+str(result["days"]).rjust(6)
+    line += format(result["setup_s"], ".3g").rjust(11)
+    if result["day_s"] is not None:
+        line += format(result["day_s"], ".3g").rjust(11)+(format(result["work_per_s"], ".3g")+" "+result["unit"]+"/s").rjust(20)
+    else:
+        line += "-".rjust(11)+"-".rjust(20)
+    if result["peak_rss_mb"] is not None:
+        line += format(result["peak_rss_mb"], ".0f").rjust(10)
+    return line
+
+def main():
+    parser = argparse.ArgumentParser(description="Time both simulators on a ladder of sizes.")
+    parser.add_argument("--models", nargs="+", choices=["ca", "graph"], default=["ca", "graph"])
+    parser.add_argument("--modes", nargs="+", default=None, help="only run these engines / contact modes")
+    parser.add_argument("--max-size", type=int, default=None, help="skip grid sides or populations above this")
+    parser.add_argument("--days", type=int, default=20, help="days simulated per case (fewer if the outbreak ends)")
+    parser.add_argument("--seed", type=int, default=1, help="seed every case is run with")
+    parser.add_argument("--out", default="bench.json", help="results file")
+    parser.add_argument("--baseline", default=None, help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a case counts as a regression")
+    args = parser.parse_args()
+
+    cases = build_cases(args.models, args.modes, args.max_size)
+    print("model mode            size  days    setup s    day s            throughput   peak MB")
+    results = run_benchmarks(cases, args.days, args.seed, lambda result: print(format_result(result), flush=True))
+    with open(args.out, 'w') as outfile:
+        json.dump(results, outfile, indent=2)
+    print("Results written to", args.out)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as infile:
+            baseline = json.load(infile)
+        regressions = compare(results, baseline, args.tolerance)
+        for model, mode, size, metric, old, new in regressions:
+            print("REGRESSION:", model, mode, size, metric, format(old, ".3g"), "->", format(new, ".3g"), "("+format(new/old-1, "+.0%")+")")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+if __name__ == "__main__":
+    main()
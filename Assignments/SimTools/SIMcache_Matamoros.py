@@ -0,0 +1,96 @@
+# Simulation Tools - Result Cache
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module saves the daily counts of finished runs on disk so they never have to be simulated twice.
+#       Every run is stored in its own file named after a hash of everything that decides its numbers: the
+#       model, its params, the seed, the model's engine version, and the contents of any input files the
+#       params name. When the cache grows past its size limit, the least recently used runs are deleted first.
+
+import hashlib
+import json
+import os
+import numpy as np
+from SIMmodels_Matamoros import ENGINE_VERSIONS, OUTPUT_ONLY_KEYS, input_files
+
+# digests of input files already read, by (path, size, modification time), so a sweep over thousands of
+#       runs reads each file once
+file_digests = {}
+
+# hash of a file's contents, or None if it doesn't exist (the run itself will then fail)
+def file_digest(path):
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    stamp = (os.path.abspath(path), status.st_size, status.st_mtime_ns)
+    if stamp not in file_digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as infile:
+            for block in iter(lambda: infile.read(1 << 20), b''):
+                digest.update(block)
+        file_digests[stamp] = digest.hexdigest()
+    return file_digests[stamp]
+
+# canonical hash of one run. Params are written as JSON with sorted keys and no whitespace, so the same
+#       scenario always gives the same key no matter how its params dictionary was put together. Input files
+#       (see `SIMmodels_Matamoros.input_files`) go in by content, so editing one in place isn't mistaken for
+#       the same run.
+def run_key(model, params, seed):
+    inputs = {path: file_digest(path) for path in input_files(params)}
+    params = {key: value for key, value in params.items() if key not in OUTPUT_ONLY_KEYS}
+    description = {"model": model, "engine_version": ENGINE_VERSIONS[model], "params": params, "seed": seed, "inputs": inputs}
+    text = json.dumps(description, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class ResultCache:
+    # `directory` is created if it doesn't exist. `max_bytes` is the size the cache is trimmed back to
+    #       after every store, or None for no limit.
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key+".npy")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    # the saved daily counts of a run, or None if it isn't cached. A hit marks the run as recently used.
+    def load(self, key):
+        path = self.path(key)
+        try:
+            series = np.load(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)
+        return series
+
+    # save a run's daily counts. The file is written under a temporary name and then renamed, so a sweep
+    #       that gets killed part way never leaves a half-written result behind.
+    def store(self, key, series):
+        path = self.path(key)
+        temporary = path+".tmp"
+        with open(temporary, 'wb') as f:
+            np.save(f, series)
+        os.replace(temporary, path)
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    # delete the least recently used runs until the cache takes up at most `max_bytes`
+    def evict(self, max_bytes):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                info = os.stat(os.path.join(self.directory, name))
+                entries.append((info.st_mtime, info.st_size, name))
+                total += info.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
@@ -0,0 +1,55 @@
+# Simulation Tools - Checkpoints
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module saves a running simulation to a checkpoint file and reads it back, so a long run that gets
+#       killed can pick up from its last checkpoint instead of starting over. A checkpoint is a compressed
+#       `.npz` file holding the simulation's arrays (grids or population arrays, contact weights, the days
+#       simulated so far) plus one JSON document with everything else: the model, its `ENGINE_VERSION`, the
+#       params, the seed, the current counts, and the state of every random number generator. Resuming from
+#       it gives exactly the same numbers the run would have given had it never stopped.
+#       Both simulators' `Simulation` objects have `checkpoint(path)` and `Simulation.resume(path)`, and
+#       `run_to_end` below steps one through a whole run, saving a checkpoint to `checkpoint_file` every
+#       `checkpoint_every` days.
+
+import json
+import os
+import numpy as np
+
+# version of the checkpoint layout itself
+FORMAT_VERSION = 1
+
+# write a checkpoint of `model` to `path`. `state` is a JSON-friendly dictionary and `arrays` maps names to
+#       NumPy arrays. The file is written next to `path` first and then moved over it, so a run killed while
+#       saving still leaves the previous checkpoint intact.
+def save_checkpoint(path, model, engine_version, state, arrays):
+    document = dict(state, format=FORMAT_VERSION, model=model, engine_version=engine_version)
+    temporary = path+".tmp"
+    with open(temporary, 'wb') as outfile:
+        np.savez_compressed(outfile, checkpoint=np.array(json.dumps(document)), **arrays)
+    os.replace(temporary, path)
+
+# read a checkpoint of `model` back. Raises a ValueError if it belongs to another model, or was saved by a
+#       different `ENGINE_VERSION`, since resuming it wouldn't give the same numbers.
+#       Returns the state dictionary and the arrays, like they were given to `save_checkpoint`.
+def load_checkpoint(path, model, engine_version):
+    with np.load(path) as checkpoint:
+        state = json.loads(checkpoint["checkpoint"].item())
+        arrays = {name: checkpoint[name] for name in checkpoint.files if name != "checkpoint"}
+    if state.get("format") != FORMAT_VERSION or state.get("model") != model:
+        raise ValueError(path+" is not a checkpoint of the "+model+" model.")
+    if state.get("engine_version") != engine_version:
+        raise ValueError(path+" was saved by engine version "+str(state.get("engine_version"))+", but this is version "+engine_version+", so resuming it wouldn't give the same numbers.")
+    return state, arrays
+
+# step `simulation` through to the end of the outbreak. If params has a `checkpoint_file`, a checkpoint is
+#       saved there every `checkpoint_every` days (10 by default) and once more at the end.
+def run_to_end(simulation, params):
+    path = params.get("checkpoint_file")
+    every = max(1, params.get("checkpoint_every", 10))
+    for day, counts in simulation.run():
+        if path and (day+1) % every == 0:
+            simulation.checkpoint(path)
+    if path:
+        simulation.checkpoint(path)
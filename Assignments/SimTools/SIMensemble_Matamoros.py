@@ -0,0 +1,83 @@
+# Simulation Tools - Monte Carlo Ensemble
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       A single run of either simulator is one random outcome of the outbreak. This program runs many
+#       replicates of the same scenario over a pool of worker processes, each with its own independent and
+#       reproducible seed, stacks their daily S/L/I/R counts into one array, and writes the per-day mean and
+#       quantiles so the spread of outcomes can be plotted as confidence bands.
+#
+#       python SIMensemble_Matamoros.py <ca|graph> <params.json> <replicates> [--seed S] [--workers W] [--out FILE]
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from SIMmodels_Matamoros import COMPARTMENTS, load_params, run_model
+from SIMoutput_Matamoros import stack_series
+
+# the quantiles written next to the mean
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# derive one seed per replicate from a single master seed. Every replicate gets a statistically independent
+#       stream, and the same master seed always gives the same replicate seeds.
+def replicate_seeds(seed, replicates):
+    children = np.random.SeedSequence(seed).spawn(replicates)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+# worker-process entry point: run one replicate
+def run_replicate(job):
+    model, params, seed = job
+    return run_model(model, params, seed)
+
+# run `replicates` realizations of `model` with `params` over `workers` processes (all cores by default).
+#       Returns the stacked daily counts and the seed of every replicate.
+def run_ensemble(model, params, replicates, seed=None, workers=None):
+    seeds = replicate_seeds(seed, replicates)
+    jobs = [(model, params, replicate_seed) for replicate_seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        series_list = list(pool.map(run_replicate, jobs))
+    return stack_series(series_list), seeds
+
+# per-day mean and quantiles across replicates. Returns the mean with shape (days, compartments) and the
+#       quantiles with shape (len(quantiles), days, compartments).
+def summarize(stacked, quantiles=QUANTILES):
+    return stacked.mean(axis=0), np.quantile(stacked, quantiles, axis=0)
+
+# write the per-day mean and quantiles as a csv file with one row per day
+def write_summary(path, mean, quantile_values, quantiles=QUANTILES):
+    header = ["day"]
+    for name in COMPARTMENTS:
+        header.append(name+"_mean")
+        header.extend(name+"_q"+format(q*100, "g") for q in quantiles)
+    with open(path, 'w') as outfile:
+        outfile.write(','.join(header)+'\n')
+        for day in range(mean.shape[0]):
+            row = [str(day)]
+            for c in range(len(COMPARTMENTS)):
+                row.append(format(mean[day, c], ".6g"))
+                row.extend(format(quantile_values[q, day, c], ".6g") for q in range(len(quantiles)))
+            outfile.write(','.join(row)+'\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many replicates of one scenario and summarize them.")
+    parser.add_argument("model", choices=["ca", "graph"])
+    parser.add_argument("params")
+    parser.add_argument("replicates", type=int)
+    parser.add_argument("--seed", type=int, default=None, help="master seed; replicate seeds are derived from it")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--out", default="ensemble.csv", help="per-day mean and quantiles")
+    parser.add_argument("--raw", default=None, help="optional .npy file for the full (replicates, days, 4) array")
+    args = parser.parse_args()
+
+    params = load_params(args.params)
+    seed = args.seed if args.seed is not None else params.get("seed")
+    stacked, _ = run_ensemble(args.model, params, args.replicates, seed, args.workers)
+    mean, quantile_values = summarize(stacked)
+    write_summary(args.out, mean, quantile_values)
+    if args.raw:
+        np.save(args.raw, stacked)
+    print("Ran", args.replicates, "replicates over", stacked.shape[1], "days; summary written to", args.out)
+
+if __name__ == "__main__":
+    main()
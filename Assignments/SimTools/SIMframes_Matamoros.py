@@ -0,0 +1,163 @@
+# Simulation Tools - Frame Files
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       A frame file holds a run's state grid for every recorded day, one byte per cell, so a run can be
+#       replayed or analysed after it finishes instead of being printed to the terminal while it runs.
+#       The CA model records its grid (rows x cols); the graph model records everyone's state as a single
+#       row (1 x population).
+#
+#       The file is a 32-byte header followed by the frames, one after another, each stored row by row:
+#           bytes  0-7   magic  b"SLIRFRM1"
+#           bytes  8-11  rows         (little-endian uint32)
+#           bytes 12-15  cols         (little-endian uint32)
+#           bytes 16-23  frames       (little-endian uint64) number of frames written
+#           bytes 24-31  capacity     (little-endian uint64) number of frames there is room for
+#
+#       Frames can be written two ways: `FrameWriter` streams them to the end of the file in buffered chunks,
+#       and `FrameRecorder` preallocates room for many frames and writes each one straight into a memory-mapped
+#       view of the file. Either way, `Replay` opens the file memory-mapped too, so any day or any cell's
+#       history can be sliced out of runs far bigger than RAM without loading the rest.
+#
+#       python SIMframes_Matamoros.py <frames file> [--day D] prints one frame (the last one by default)
+#       the way the CA model used to print its grid, and [--cell ROW COL] prints one cell's state every day.
+
+import argparse
+import struct
+import numpy as np
+
+MAGIC = b"SLIRFRM1"
+HEADER = struct.Struct("<8sIIQQ")
+
+# read the header of a frame file. Returns (rows, cols, frames, capacity).
+def read_header(f):
+    magic, rows, cols, frames, capacity = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a frame file.")
+    return rows, cols, frames, capacity
+
+# Appends frames to a frame file. Frames are collected in a buffer of `buffer_frames` frames and written
+#       to disk in bulk whenever it fills up, and once more when the writer is closed.
+class FrameWriter:
+    def __init__(self, path, rows, cols, buffer_frames=64):
+        self.rows = rows
+        self.cols = cols
+        self.frames = 0
+        self.buffer = np.empty((buffer_frames, rows, cols), dtype=np.uint8)
+        self.buffered = 0
+        self.f = open(path, 'wb')
+        self.f.write(HEADER.pack(MAGIC, rows, cols, 0, 0))
+
+    def append(self, frame):
+        self.buffer[self.buffered] = frame
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.f.write(self.buffer[:self.buffered].tobytes())
+        self.frames += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, self.rows, self.cols, self.frames, self.frames))
+        self.f.close()
+
+# Writes frames straight into a memory-mapped frame file with room for `capacity` frames set aside up front.
+#       The header's frame count is kept up to date after every frame, so a run that gets killed part way
+#       still leaves a readable file. If the run outlasts its capacity, the file is grown to twice the size.
+#       When closed, the unused room at the end is cut off. With `keep`, the first `keep` frames of an existing
+#       file of the same size are kept and recording carries on after them, for a run resumed from a checkpoint.
+class FrameRecorder:
+    def __init__(self, path, rows, cols, capacity=1024, keep=0):
+        self.path = path
+        self.rows = rows
+        self.cols = cols
+        self.frames = 0
+        if keep:
+            with open(path, 'rb') as f:
+                old_rows, old_cols, old_frames, _ = read_header(f)
+            if (old_rows, old_cols) != (rows, cols) or old_frames < keep:
+                raise ValueError(path+" doesn't hold the first "+str(keep)+" frames of a "+str(rows)+" x "+str(cols)+" run.")
+            self.frames = keep
+        else:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, rows, cols, 0, 0))
+        self.map(max(self.frames+1, capacity))
+
+    # (re)map the file with room for `capacity` frames
+    def map(self, capacity):
+        self.capacity = capacity
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER.size + capacity*self.rows*self.cols)
+        # the frame count and capacity fields of the header
+        self.counters = np.memmap(self.path, dtype='<u8', mode='r+', offset=16, shape=(2,))
+        self.counters[:] = (self.frames, capacity)
+        self.data = np.memmap(self.path, dtype=np.uint8, mode='r+', offset=HEADER.size, shape=(capacity, self.rows, self.cols))
+
+    def append(self, frame):
+        if self.frames == self.capacity:
+            self.data.flush()
+            del self.data
+            self.map(self.capacity*2)
+        self.data[self.frames] = frame
+        self.frames += 1
+        self.counters[0] = self.frames
+
+    def close(self):
+        self.data.flush()
+        self.counters[1] = self.frames
+        self.counters.flush()
+        del self.data, self.counters
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER.size + self.frames*self.rows*self.cols)
+
+# Read-only, memory-mapped view of a frame file. Nothing is read from disk until it is sliced, so opening
+#       a run with thousands of frames of a huge grid is instant.
+#       replay.frames        -> (days, rows, cols) memory-mapped array; any NumPy slice of it works
+#       replay.frame(day)    -> one day's grid
+#       replay.cell(row, col)-> one cell's state on every day
+#       replay.counts(day)   -> how many cells are in each state (0-4) on that day
+class Replay:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.rows, self.cols, self.num_days, _ = read_header(f)
+        if self.num_days:
+            self.frames = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(self.num_days, self.rows, self.cols))
+        else:
+            self.frames = np.zeros((0, self.rows, self.cols), dtype=np.uint8)
+
+    def __len__(self):
+        return self.num_days
+
+    def frame(self, day):
+        return self.frames[day]
+
+    def cell(self, row, col):
+        return self.frames[:, row, col]
+
+    def counts(self, day, num_states=5):
+        return np.bincount(self.frames[day].ravel(), minlength=num_states)
+
+# load every frame of a frame file into a (frames, rows, cols) array in memory
+def read_frames(path):
+    return np.array(Replay(path).frames)
+
+def main():
+    parser = argparse.ArgumentParser(description="Print one frame, or one cell's history, from a frame file.")
+    parser.add_argument("frames")
+    parser.add_argument("--day", type=int, default=-1, help="frame to print (default: the last one)")
+    parser.add_argument("--cell", type=int, nargs=2, metavar=("ROW", "COL"), help="print this cell's state on every day instead")
+    args = parser.parse_args()
+    replay = Replay(args.frames)
+    if args.cell:
+        print(''.join(str(state) for state in replay.cell(*args.cell).tolist()))
+    else:
+        frame = replay.frame(args.day)
+        print('\n'.join(''.join(str(state) for state in row) for row in frame.tolist()))
+
+if __name__ == "__main__":
+    main()
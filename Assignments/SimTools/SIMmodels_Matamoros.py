@@ -0,0 +1,77 @@
+# Simulation Tools - Model Registry
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module lets the tools in this folder run either simulator by name. It puts the `CA_Project` and
+#       `PythonGraphing` folders on the import path and maps a short model name to that model's `simulate`
+#       function, which takes a params dictionary and a seed and returns the daily S/L/I/R counts.
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+for folder in ("CA_Project", "PythonGraphing"):
+    path = os.path.normpath(os.path.join(HERE, "..", folder))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import CAmain_Matamoros
+import GraphSLIR_Matamoros
+
+# model name -> `simulate(params, seed)` function
+MODELS = {
+    "ca": CAmain_Matamoros.simulate,
+    "graph": GraphSLIR_Matamoros.simulate,
+}
+
+# model name -> version of that model's behaviour, part of every saved result's cache key
+ENGINE_VERSIONS = {
+    "ca": CAmain_Matamoros.ENGINE_VERSION,
+    "graph": GraphSLIR_Matamoros.ENGINE_VERSION,
+}
+
+# params that only control files, drawing, or printing, so they never change a run's numbers. They are left
+#       out of a run's cache key (see `SIMcache_Matamoros.run_key`).
+OUTPUT_ONLY_KEYS = (
+    "show_graph", "export_graph", "seed",
+    # reports and progress
+    "output_file", "verbosity", "progress_every", "snapshot_file",
+    # recorded frames
+    "record_file", "record_capacity",
+    # profiling
+    "profile", "profile_file", "profile_interval",
+    # checkpoints
+    "checkpoint_file", "checkpoint_every", "resume_file",
+    # drawings (see `SIMrender_Matamoros.py`)
+    "plot_file", "image_file", "animation_file", "animation_every",
+    "degree_plot_file", "graph_image", "graph_sample", "graph_layout",
+)
+
+# the files a run reads its inputs from: the CA model's `density_file` and the graph model's "edge_list"
+#       network layers. Their contents decide the run's numbers just like the params do.
+def input_files(params):
+    paths = []
+    if params.get("density_file"):
+        paths.append(params["density_file"])
+    layers = params.get("network") or []
+    for layer in ([layers] if isinstance(layers, dict) else layers):
+        if isinstance(layer, dict) and layer.get("model") == "edge_list" and layer.get("file"):
+            paths.append(layer["file"])
+    return paths
+
+# the columns of the array every `simulate` function returns
+COMPARTMENTS = ("susceptible", "latent", "infectious", "recovered")
+
+# loads a params .json file into a dictionary
+def load_params(infile):
+    with open(infile, 'r') as f:
+        return json.load(f)
+
+# run one realization of `model` without writing any files, drawing, or printing to the terminal (unless
+#       the given `tracer` prints). Every output-only param is dropped, so replicates running side by side
+#       never share a frame file or checkpoint. Returns the daily S/L/I/R counts.
+def run_model(model, params, seed, tracer=None):
+    params = {key: value for key, value in params.items() if key not in OUTPUT_ONLY_KEYS}
+    return MODELS[model](params, seed=seed, tracer=tracer)
@@ -0,0 +1,162 @@
+# Simulation Tools - Output Layer
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module lets a simulator send its daily counts to a "sink" instead of writing text itself. The
+#       columnar sink keeps every day's counts in memory and saves them all at once, together with per-person
+#       arrays (like contact counts) and the run's params, to one compressed binary file: `.npz` with NumPy,
+#       or `.parquet` when pyarrow is installed. Those files are read back with `load_run`/`load_runs`, which
+#       stack many runs into one array without parsing any text.
+#
+#       Every sink has the same three methods:
+#           write_day(row)              -> one day's counts, in the order of the sink's columns
+#           write_people(name, values)  -> one value per person, e.g. "num_contacts"
+#           close()                     -> finish the file
+#       and can be used in a `with` block, which calls `close()` at the end. The `Sink` class below provides
+#       the `with` support and does-nothing defaults, so a new sink only overrides what it needs.
+
+import json
+import os
+import numpy as np
+
+# runs of different lengths are lined up by padding each one with its final day, since nothing changes
+#       after an outbreak ends. Returns an array of shape (runs, days, columns).
+def stack_series(series_list):
+    num_days = max(len(series) for series in series_list)
+    stacked = np.zeros((len(series_list), num_days, series_list[0].shape[1]), dtype=series_list[0].dtype)
+    for i, series in enumerate(series_list):
+        if len(series):
+            stacked[i, :len(series)] = series
+            stacked[i, len(series):] = series[-1]
+    return stacked
+
+class Sink:
+    def write_day(self, row):
+        pass
+
+    def write_people(self, name, values):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# the file name per-person arrays are saved under next to a `.parquet` file, since they have one row per
+#       person instead of one row per day
+def people_path(path):
+    return os.path.splitext(path)[0]+"_people.parquet"
+
+# Buffers the daily counts in a growing integer array and writes everything in bulk when closed. The file
+#       format follows the extension of `path`: `.parquet` needs pyarrow, anything else is saved as `.npz`.
+#       `metadata` is any JSON-friendly dictionary, normally {"model", "params", "seed", "engine_version"}.
+class ColumnarSink(Sink):
+    def __init__(self, path, columns, metadata=None):
+        self.path = path
+        self.columns = list(columns)
+        self.metadata = metadata or {}
+        self.rows = np.zeros((64, len(self.columns)), dtype=np.int64)
+        self.num_rows = 0
+        self.people = {}
+
+    def write_day(self, row):
+        if self.num_rows == len(self.rows):
+            self.rows = np.concatenate((self.rows, np.zeros_like(self.rows)))
+        self.rows[self.num_rows] = row
+        self.num_rows += 1
+
+    def write_people(self, name, values):
+        self.people[name] = np.asarray(values)
+
+    # the buffered daily counts, one row per day
+    def data(self):
+        return self.rows[:self.num_rows]
+
+    def close(self):
+        if self.path.endswith(".parquet"):
+            self.close_parquet()
+        else:
+            arrays = {"people_"+name: values for name, values in self.people.items()}
+            np.savez_compressed(self.path, data=self.data(), columns=np.array(self.columns),
+                                metadata=np.array(json.dumps(self.metadata)), **arrays)
+
+    def close_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing .parquet output needs pyarrow; install it or use a .npz file instead.")
+        schema_metadata = {"metadata": json.dumps(self.metadata)}
+        data = self.data()
+        table = pa.table({name: data[:, i] for i, name in enumerate(self.columns)})
+        pq.write_table(table.replace_schema_metadata(schema_metadata), self.path)
+        if self.people:
+            pq.write_table(pa.table(self.people), people_path(self.path))
+
+# Sends every call on to several sinks, e.g. a columnar file and the old text report at the same time
+class MultiSink(Sink):
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write_day(self, row):
+        for sink in self.sinks:
+            sink.write_day(row)
+
+    def write_people(self, name, values):
+        for sink in self.sinks:
+            sink.write_people(name, values)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+# open a sink for each file in `paths` (one file name or a list of them): `.npz` and `.parquet` files get a
+#       `ColumnarSink`, anything else gets the simulator's own text sink, `text_sink(path)`
+def open_sinks(paths, columns, metadata, text_sink):
+    if isinstance(paths, str):
+        paths = [paths]
+    sinks = []
+    for path in paths:
+        if path.endswith(".npz") or path.endswith(".parquet"):
+            sinks.append(ColumnarSink(path, columns, metadata))
+        else:
+            sinks.append(text_sink(path))
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+# read one columnar run back. Returns a dictionary with the column names ("columns"), the daily counts as a
+#       (days, columns) array ("data"), the run's metadata ("metadata"), and its per-person arrays ("people").
+def load_run(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        columns = table.column_names
+        data = np.column_stack([table.column(name).to_numpy() for name in columns])
+        raw = table.schema.metadata or {}
+        metadata = json.loads(raw.get(b"metadata", b"{}"))
+        people = {}
+        if os.path.exists(people_path(path)):
+            people_table = pq.read_table(people_path(path))
+            people = {name: people_table.column(name).to_numpy() for name in people_table.column_names}
+        return {"columns": columns, "data": data, "metadata": metadata, "people": people}
+    with np.load(path) as run:
+        return {
+            "columns": run["columns"].tolist(),
+            "data": run["data"],
+            "metadata": json.loads(run["metadata"].item()),
+            "people": {name[len("people_"):]: run[name] for name in run.files if name.startswith("people_")},
+        }
+
+# read many columnar runs into one (runs, days, columns) array, padding shorter runs with their final day.
+#       `columns` picks and orders the columns to keep (all of the first run's columns by default).
+#       Returns the stacked array and the list of column names.
+def load_runs(paths, columns=None):
+    runs = [load_run(path) for path in paths]
+    if columns is None:
+        columns = runs[0]["columns"]
+    series_list = [run["data"][:, [run["columns"].index(name) for name in columns]] for run in runs]
+    return stack_series(series_list), list(columns)
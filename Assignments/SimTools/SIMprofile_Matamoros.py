@@ -0,0 +1,202 @@
+# Simulation Tools - Profiling
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module shows where a run's time goes. Simulators wrap every stage of their daily loop in a named
+#       phase (`with profiler.phase("contacts"):`) and add up counters of the work they do
+#       (`profiler.count("infection_attempts", n)`). The `profile` param picks the profiler:
+#           (not set)   -> a `NullProfiler`, whose phases and counters do nothing, so the calls can stay in
+#                          the simulators at no measurable cost
+#           "phases"    -> phase timers and counters
+#           "cprofile"  -> phase timers and counters, plus Python's cProfile over the whole run, whose raw
+#                          stats are also saved as a `.prof` file next to the summary
+#           "sampling"  -> phase timers and counters, plus a sampling profiler that checks which function is
+#                          running every `profile_interval` seconds, which slows the run far less than cProfile
+#       At the end of the run the summary is written as JSON to `profile_file`.
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+MODES = ("phases", "cprofile", "sampling")
+
+# how many functions the summary lists in the "cprofile" and "sampling" modes
+TOP_FUNCTIONS = 25
+
+# a phase that does nothing. `NullProfiler.phase` hands out this same one every time.
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_PHASE = NullPhase()
+
+# The profiler used when profiling is off: every method does nothing
+class NullProfiler:
+    enabled = False
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def count(self, name, amount=1):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def summary(self):
+        return {}
+
+    def write(self, path):
+        pass
+
+# Adds up the wall time and the number of runs of one named phase. A phase can't be nested inside itself.
+class Phase:
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.entered = 0.0
+
+    def __enter__(self):
+        self.entered = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self.entered
+        self.calls += 1
+
+# the (function, file, first line) a code object belongs to
+def describe(code):
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+# A sampling profiler. A background thread looks at what the thread that started it is running every
+#       `interval` seconds, and counts for every function how often it was the one running ("self") and how
+#       often it was anywhere on the call stack ("total").
+class Sampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[describe(frame.f_code)] += 1
+            # a recursive function only counts once per sample
+            on_stack = set()
+            while frame is not None:
+                on_stack.add(describe(frame.f_code))
+                frame = frame.f_back
+            self.total_counts.update(on_stack)
+
+    # the functions seen running most often, with the share of samples they were running in
+    def functions(self):
+        samples = max(self.samples, 1)
+        return [{"function": function, "file": filename, "line": line, "self_share": count/samples,
+                 "total_share": self.total_counts[(function, filename, line)]/samples}
+                for (function, filename, line), count in self.self_counts.most_common(TOP_FUNCTIONS)]
+
+# the functions cProfile saw spending the most time in their own code
+def cprofile_functions(profile):
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, self_time, total_time, callers) in pstats.Stats(profile).stats.items():
+        rows.append({"function": function, "file": filename, "line": line, "calls": calls, "self_s": self_time, "total_s": total_time})
+    rows.sort(key=lambda row: row["self_s"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+# Times every phase and adds up every counter of a run, optionally under cProfile or the sampler (see the
+#       modes at the top). Call `start()` before the run and `stop()` after it, then `summary()` or `write(path)`.
+class Profiler(NullProfiler):
+    enabled = True
+
+    def __init__(self, mode="phases", interval=0.005):
+        if mode not in MODES:
+            raise ValueError("Unknown profile mode "+repr(mode)+"; pick one of "+", ".join(MODES)+".")
+        self.mode = mode
+        self.interval = interval
+        self.phases = {}
+        self.counters = {}
+        self.started = None
+        self.elapsed = 0.0
+        self.cprofile = None
+        self.sampler = None
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        return phase
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def start(self):
+        if self.mode == "cprofile":
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        elif self.mode == "sampling":
+            self.sampler = Sampler(self.interval)
+            self.sampler.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    # a JSON-friendly dictionary with the run's wall time, every phase's time, runs, and share of the wall
+    #       time, every counter, and in the "cprofile" and "sampling" modes the busiest functions
+    def summary(self):
+        # without `start()`/`stop()`, the phases are all there is to go on
+        total = self.elapsed or sum(phase.seconds for phase in self.phases.values())
+        summary = {
+            "mode": self.mode,
+            "total_s": total,
+            "phases": {name: {"seconds": phase.seconds, "calls": phase.calls, "share": phase.seconds/max(total, 1e-9)}
+                       for name, phase in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+        if self.cprofile is not None:
+            summary["functions"] = cprofile_functions(self.cprofile)
+        if self.sampler is not None:
+            summary["functions"] = self.sampler.functions()
+        return summary
+
+    def write(self, path):
+        with open(path, 'w') as outfile:
+            json.dump(self.summary(), outfile, indent=2)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(os.path.splitext(path)[0]+".prof")
+
+# build the profiler picked by the `profile` and `profile_interval` params
+def from_params(params):
+    if not params.get("profile"):
+        return NullProfiler()
+    return Profiler(params["profile"], params.get("profile_interval", 0.005))
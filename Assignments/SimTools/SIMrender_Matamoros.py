@@ -0,0 +1,245 @@
+# Simulation Tools - Rendering
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module draws runs of either simulator at any size. Drawing every person and every contact stops
+#       being readable (and finishing) long before a million people, so instead:
+#           - `plot_compartments` draws the daily susceptible/latent/infectious/recovered curves
+#           - `plot_degree_histogram` draws how many people have each number of contacts
+#           - `sample_subgraph` picks a connected-looking sample of a large contact graph, `layout` places its
+#             nodes once into an array of positions, and `draw_subgraph` draws it as one scatter and one
+#             collection of line segments, both rasterized
+#           - `to_image` turns a CA grid of location states straight into an image (shrunk to at most
+#             `max_pixels` per side by keeping every n-th cell, or blown up to about that size if it's small),
+#             `save_frame` saves one as a PNG, and `save_animation` saves a series of them as an animated GIF
+#       Nothing here opens a window: the plots are drawn on a Matplotlib `Figure` without pyplot and saved
+#       with the Agg renderer, so they work on a machine without a display. Pass `ax` to draw onto an
+#       existing set of axes instead, like the graph model's `show_graph` does.
+#       Matplotlib (and Pillow, which it installs) is only needed for the functions that draw.
+#
+#       python SIMrender_Matamoros.py <frames file> [--day D] [--out FILE] [--animate FILE] [--every N]
+#                                     [--fps F] [--max-pixels P]
+#       saves one recorded day (the last one by default) as a PNG, or every N-th day as an animated GIF.
+
+import argparse
+import numpy as np
+from SIMframes_Matamoros import Replay
+
+# the colour of every location state of the CA model (empty, susceptible, latent, infectious, recovered)
+CA_COLORS = ("#ffffff", "#14de4a", "#ffb000", "#e0202a", "#0000ff")
+# the colour of every state of the graph model (susceptible, latent, infectious, recovered, immune)
+GRAPH_COLORS = ("#14de4a", "#ffb000", "#e0202a", "#0000ff", "#ba8722")
+
+COMPARTMENTS = ("susceptible", "latent", "infectious", "recovered")
+COMPARTMENT_COLORS = ("#14de4a", "#ffb000", "#e0202a", "#0000ff")
+
+LAYOUTS = ("spring", "circular")
+
+# a new headless figure with one set of axes, or the figure of `ax` when drawing onto existing axes
+def new_axes(ax=None, figsize=(8, 5)):
+    if ax is not None:
+        return ax.figure, ax
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise ImportError("Rendering needs Matplotlib; install it to draw runs.")
+    figure = Figure(figsize=figsize)
+    return figure, figure.subplots()
+
+# save `figure` to `path` if there is one
+def save_figure(figure, path, dpi=100):
+    if path:
+        figure.savefig(path, dpi=dpi, bbox_inches="tight")
+
+# draw the daily counts (one row per day, one column per compartment, like `simulate` returns) as curves
+def plot_compartments(series, path=None, ax=None, labels=COMPARTMENTS, title=None):
+    figure, ax = new_axes(ax)
+    series = np.asarray(series)
+    days = np.arange(len(series))
+    for column, label in enumerate(labels):
+        ax.plot(days, series[:, column], label=label, color=COMPARTMENT_COLORS[column % len(COMPARTMENT_COLORS)])
+    ax.set_xlabel("day")
+    ax.set_ylabel("people")
+    ax.set_title(title or "SLIR compartments over "+str(len(series))+" days")
+    ax.legend()
+    save_figure(figure, path)
+    return figure
+
+# draw how many people have each number of contacts (`degree` holds everyone's), on log-log axes since
+#       contact networks often have a long tail of people with very many contacts
+def plot_degree_histogram(degree, path=None, ax=None, title=None):
+    figure, ax = new_axes(ax)
+    counts = np.bincount(np.asarray(degree, dtype=np.int64))
+    degrees = np.flatnonzero(counts)
+    ax.scatter(degrees, counts[degrees], s=8)
+    # people with no contacts can't be shown on a log axis
+    if len(degrees) and degrees[-1] > 0:
+        ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("number of contacts")
+    ax.set_ylabel("people")
+    ax.set_title(title or "Degree distribution ("+str(len(degree))+" people, "+str(int(counts[0]) if len(counts) else 0)+" without contacts)")
+    save_figure(figure, path)
+    return figure
+
+# the neighbours of every person in `people` of a graph given as a CSR adjacency (see `sample_subgraph`),
+#       one person's after another. Returns them and the number each person has.
+def gather_neighbours(indptr, indices, people):
+    starts = indptr[people]
+    lengths = indptr[people+1] - starts
+    return indices[np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())], lengths
+
+# pick about `sample` people of a graph given as a CSR adjacency (the neighbours of person `i` are
+#       `indices[indptr[i]:indptr[i+1]]`) so that the sample still has edges: starting from a few random
+#       people, whole rings of neighbours are added until the sample is big enough. Picking people uniformly
+#       instead would leave almost no edges between them in a large, sparse graph.
+#       Returns the sampled people, and the edges between them as pairs of positions in that array.
+def sample_subgraph(rng, indptr, indices, sample=1000):
+    population_size = len(indptr)-1
+    sample = min(sample, population_size)
+    chosen = np.zeros(population_size, dtype=bool)
+    nodes = []
+    num_chosen = 0
+    while num_chosen < sample:
+        # start a new ring from a few random people who aren't in the sample yet
+        frontier = rng.choice(np.flatnonzero(~chosen), size=min(max(1, sample//50), population_size-num_chosen), replace=False)
+        while len(frontier) and num_chosen < sample:
+            frontier = frontier[:sample-num_chosen]
+            chosen[frontier] = True
+            nodes.append(frontier)
+            num_chosen += len(frontier)
+            # the next ring: every neighbour of this one not in the sample yet
+            neighbours, _ = gather_neighbours(indptr, indices, frontier)
+            neighbours = np.unique(neighbours[~chosen[neighbours]])
+            frontier = rng.permutation(neighbours)
+    nodes = np.concatenate(nodes) if nodes else np.zeros(0, dtype=np.int64)
+    # the edges between sampled people, each once
+    position = np.full(population_size, -1, dtype=np.int64)
+    position[nodes] = np.arange(len(nodes))
+    neighbours, lengths = gather_neighbours(indptr, indices, nodes)
+    first = np.repeat(np.arange(len(nodes)), lengths)
+    second = position[neighbours]
+    keep = second > first
+    return nodes, np.column_stack((first[keep], second[keep]))
+
+# place `num_nodes` nodes with the given edges (pairs of node positions) once, as a (num_nodes, 2) array of
+#       positions. "spring" is a force-directed (Fruchterman-Reingold) layout, where every pair of nodes
+#       pushes apart and every edge pulls its two ends together, worked out for all nodes at once with
+#       array operations, fine for the few thousand nodes of a sample; "circular" puts the nodes evenly
+#       around a circle, in order, and takes no time at all.
+def layout(num_nodes, edges, kind="spring", seed=None, iterations=50):
+    if kind == "circular" or num_nodes < 2:
+        angle = np.linspace(0, 2*np.pi, num_nodes, endpoint=False)
+        return np.column_stack((np.cos(angle), np.sin(angle)))
+    if kind not in LAYOUTS:
+        raise ValueError("Unknown layout "+repr(kind)+"; pick one of "+", ".join(LAYOUTS)+".")
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    x, y = np.random.default_rng(seed).random((2, num_nodes))
+    # the ideal distance between nodes, and how far a node may move in one step (cooling down to zero)
+    k = 1.0/np.sqrt(num_nodes)
+    temperatures = np.linspace(0.1, 0, iterations+1)[:-1]
+    # the pushes between every pair of nodes are added up a block of rows at a time to bound the memory used
+    block = max(1, 4000000//num_nodes)
+    for temperature in temperatures:
+        move_x = np.empty(num_nodes)
+        move_y = np.empty(num_nodes)
+        for start in range(0, num_nodes, block):
+            dx = x[start:start+block, None] - x
+            dy = y[start:start+block, None] - y
+            push = k*k/np.maximum(dx*dx + dy*dy, 1e-4)
+            move_x[start:start+block] = (dx*push).sum(axis=1)
+            move_y[start:start+block] = (dy*push).sum(axis=1)
+        dx = x[edges[:, 0]] - x[edges[:, 1]]
+        dy = y[edges[:, 0]] - y[edges[:, 1]]
+        pull = np.sqrt(dx*dx + dy*dy)/k
+        move_x -= np.bincount(edges[:, 0], dx*pull, num_nodes) - np.bincount(edges[:, 1], dx*pull, num_nodes)
+        move_y -= np.bincount(edges[:, 0], dy*pull, num_nodes) - np.bincount(edges[:, 1], dy*pull, num_nodes)
+        length = np.maximum(np.sqrt(move_x*move_x + move_y*move_y), 1e-9)
+        step = np.minimum(length, temperature)/length
+        x += move_x*step
+        y += move_y*step
+    return np.column_stack((x, y))
+
+# draw a graph from its node positions (see `layout`), edges (pairs of node positions), and every node's
+#       colour. The nodes and edges are each drawn as a single rasterized collection, so thousands of them
+#       draw quickly and make small files. A dense sample can still have far more edges than can be told
+#       apart, so at most `max_edges` of them, evenly spread through the list, are drawn.
+def draw_subgraph(positions, edges, colors, path=None, ax=None, title=None, max_edges=5000):
+    from matplotlib.collections import LineCollection
+    figure, ax = new_axes(ax, figsize=(8, 8))
+    if len(edges) > max_edges:
+        edges = edges[np.linspace(0, len(edges)-1, max_edges).astype(np.int64)]
+    if len(edges):
+        ax.add_collection(LineCollection(positions[edges], colors="#888888", linewidths=0.25, rasterized=True))
+    ax.scatter(positions[:, 0], positions[:, 1], c=colors, s=12, linewidths=0, rasterized=True, zorder=2)
+    ax.set_aspect("equal")
+    ax.set_axis_off()
+    if title:
+        ax.set_title(title)
+    save_figure(figure, path, dpi=150)
+    return figure
+
+# the colour of every node of a sample from a state array and a colour per state code (like GRAPH_COLORS)
+def node_colors(state, nodes, colors=GRAPH_COLORS):
+    return np.array(colors)[state[nodes]]
+
+# the RGB values (0-255) of a list of hex colours, as a (colours, 3) lookup table
+def color_table(colors):
+    return np.array([[int(color[i:i+2], 16) for i in (1, 3, 5)] for color in colors], dtype=np.uint8)
+
+# turn a grid of location states (like a CA frame) into a Pillow image, keeping every n-th row and column so
+#       neither side is larger than `max_pixels`, with `scale` screen pixels per cell. By default, small
+#       grids are blown up to nearly `max_pixels` on their longest side. The states are used as-is as the
+#       colour indices of a palette image, so nothing has to be converted or quantized (which is what makes
+#       GIFs slow to write).
+def to_image(frame, colors=CA_COLORS, max_pixels=1000, scale=None):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Saving images needs Pillow (installed with Matplotlib); install it to draw runs.")
+    frame = np.asarray(frame)
+    step = max(1, -(-max(frame.shape) // max_pixels))
+    indices = np.ascontiguousarray(frame[::step, ::step], dtype=np.uint8)
+    if scale is None:
+        scale = max(1, max_pixels // max(indices.shape))
+    # an 8-bit grayscale image turns into a palette image once it's given a palette
+    image = Image.fromarray(indices)
+    image.putpalette(color_table(colors).ravel().tolist())
+    if scale > 1:
+        image = image.resize((image.width*scale, image.height*scale), Image.NEAREST)
+    return image
+
+# save one grid of location states as a PNG image
+def save_frame(frame, path, colors=CA_COLORS, max_pixels=1000, scale=None):
+    to_image(frame, colors, max_pixels, scale).save(path)
+
+# save every `every`-th grid of a (days, rows, cols) array of location states (like `Replay(path).frames`,
+#       which is only read from disk one day at a time here) as an animated GIF at `fps` frames per second
+def save_animation(frames, path, colors=CA_COLORS, every=1, fps=10, max_pixels=500, scale=None):
+    images = [to_image(frames[day], colors, max_pixels, scale) for day in range(0, len(frames), max(1, every))]
+    if not images:
+        raise ValueError("There are no frames to animate.")
+    images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000/fps), loop=0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw the days saved in a frame file.")
+    parser.add_argument("frames", help="frame file, like a CA run's record_file")
+    parser.add_argument("--day", type=int, default=-1, help="day to save as an image (the last one by default)")
+    parser.add_argument("--out", default="frame.png", help="image file for --day")
+    parser.add_argument("--animate", default=None, help="save every --every-th day as this animated GIF instead")
+    parser.add_argument("--every", type=int, default=1, help="days between animation frames")
+    parser.add_argument("--fps", type=float, default=10, help="animation frames per second")
+    parser.add_argument("--max-pixels", type=int, default=None, help="largest image side; bigger grids keep every n-th cell (1000 for an image, 500 for an animation)")
+    args = parser.parse_args()
+
+    replay = Replay(args.frames)
+    if args.animate:
+        save_animation(replay.frames, args.animate, every=args.every, fps=args.fps, max_pixels=args.max_pixels or 500)
+        print("Animation written to", args.animate)
+    else:
+        save_frame(replay.frame(args.day), args.out, max_pixels=args.max_pixels or 1000)
+        print("Day", args.day % len(replay), "written to", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# Simulation Tools - Parameter Sweep
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This program runs a simulator over a grid of parameter values. A sweep file names the model, the base
+#       params file, and a list or range of values for any of its keys; every combination of values becomes a
+#       scenario, and every scenario is run for the same set of replicate seeds. Runs are spread over all cores
+#       and each one is saved in the result cache as soon as it finishes, so re-running an overlapping sweep
+#       only simulates the new points, and an interrupted sweep picks up where it stopped.
+#
+#       python SIMsweep_Matamoros.py <sweep.json> [--workers W] [--cache DIR] [--cache-mb MB] [--out FILE]
+#
+#       Example sweep file (the base path is relative to the sweep file):
+#           {
+#               "model": "graph",
+#               "base": "../PythonGraphing/params.json",
+#               "sweep": {
+#                   "trans_rate": [0.5, 0.6, 0.7],
+#                   "num_contacts": {"start": 2, "stop": 10, "step": 2},
+#                   "immune_perc": {"start": 0.0, "stop": 0.2, "num": 5}
+#               },
+#               "replicates": 20,
+#               "seed": 1
+#           }
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import json
+import os
+import numpy as np
+from SIMmodels_Matamoros import load_params
+from SIMcache_Matamoros import ResultCache, run_key
+from SIMensemble_Matamoros import replicate_seeds, run_replicate
+from SIMoutput_Matamoros import stack_series
+
+# the master seed of a sweep file without a "seed". It has to be fixed rather than random, or every re-run of
+#       the file would get new replicate seeds and never find its earlier runs in the cache.
+DEFAULT_SEED = 0
+
+# turn one sweep entry into its list of values. An entry is either a list of values, or a range given as
+#       {"start", "stop", "step"} (stop excluded, like Python's `range`) or {"start", "stop", "num"}
+#       (`num` evenly spaced values, stop included). Floats are rounded to 12 digits so a value like
+#       0.30000000000000004 hashes the same as 0.3. When the base params hold an integer for the key (like
+#       `population` or `num_contacts`), whole-number values are turned into integers, and any other value
+#       raises a ValueError, since the simulators can't use it.
+def expand_values(entry, key=None, base_value=None):
+    if isinstance(entry, dict):
+        if "num" in entry:
+            values = np.linspace(entry["start"], entry["stop"], entry["num"])
+        else:
+            values = np.arange(entry["start"], entry["stop"], entry.get("step", 1))
+        values = values.tolist()
+    else:
+        values = list(entry)
+    values = [round(value, 12) if isinstance(value, float) else value for value in values]
+    if isinstance(base_value, int) and not isinstance(base_value, bool):
+        for value in values:
+            if not (isinstance(value, (int, float)) and float(value).is_integer()):
+                raise ValueError("Swept key '"+str(key)+"' needs whole numbers, but got "+repr(value)+".")
+        values = [int(value) for value in values]
+    return values
+
+# every combination of the swept values, as a list of full params dictionaries
+def expand_sweep(base, sweep):
+    keys = sorted(sweep)
+    for key in keys:
+        if key not in base:
+            raise ValueError("Swept key '"+key+"' is not in the base params.")
+    points = []
+    for values in itertools.product(*(expand_values(sweep[key], key, base[key]) for key in keys)):
+        params = dict(base)
+        params.update(zip(keys, values))
+        points.append(params)
+    return points
+
+# build the job list: one (model, params, seed) job for every replicate of every point
+def build_jobs(model, points, seeds):
+    return [(model, params, seed) for params in points for seed in seeds]
+
+# collect the daily counts of every job, keyed by `run_key`. Jobs already in `cache` are loaded from it; the
+#       rest are run over `workers` processes and stored in the cache as each one finishes. Results are also
+#       kept in memory, so a cache smaller than the sweep itself still gives complete results.
+#       Returns the results and the number of runs that had to be simulated.
+def collect_runs(jobs, cache, workers=None):
+    results = {}
+    pending = []
+    for job in jobs:
+        key = run_key(*job)
+        if key in results:
+            continue
+        series = cache.load(key)
+        if series is None:
+            pending.append(job)
+            results[key] = None
+        else:
+            results[key] = series
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_replicate, job): run_key(*job) for job in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                results[key] = future.result()
+                cache.store(key, results[key])
+                print("Finished run", done, "of", len(pending), flush=True)
+    return results, len(pending)
+
+# stack the runs of one point into a (replicates, days, 4) array
+def stack_point(model, params, seeds, results):
+    return stack_series([results[run_key(model, params, seed)] for seed in seeds])
+
+# write one row per point with the swept values and summary statistics of its replicates: the mean final
+#       number recovered (the outbreak size), the mean and 95th-percentile peak of infectious people, and the
+#       mean outbreak length in days
+def write_results(path, keys, points, stacked_points):
+    with open(path, 'w') as outfile:
+        outfile.write(','.join(keys+["replicates", "final_recovered_mean", "peak_infectious_mean", "peak_infectious_q95", "days_mean"])+'\n')
+        for params, stacked in zip(points, stacked_points):
+            final_recovered = stacked[:, -1, 3]
+            peak_infectious = stacked[:, :, 2].max(axis=1)
+            # a replicate's last day is the first day with no latent nor infectious people left
+            active = (stacked[:, :, 1] + stacked[:, :, 2]) > 0
+            days = active.sum(axis=1) + 1
+            row = [str(params[key]) for key in keys]
+            row += [str(len(stacked)), format(final_recovered.mean(), ".6g"), format(peak_infectious.mean(), ".6g"),
+                    format(np.quantile(peak_infectious, 0.95), ".6g"), format(days.mean(), ".6g")]
+            outfile.write(','.join(row)+'\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a simulator over a grid of parameter values.")
+    parser.add_argument("sweep")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--cache", default="sweep_cache", help="directory of saved runs")
+    parser.add_argument("--cache-mb", type=float, default=1024, help="size the cache is trimmed back to, in MB")
+    parser.add_argument("--out", default="sweep_results.csv", help="one summary row per point")
+    args = parser.parse_args()
+
+    with open(args.sweep, 'r') as f:
+        spec = json.load(f)
+    base = spec["base"]
+    if not isinstance(base, dict):
+        base = load_params(os.path.join(os.path.dirname(os.path.abspath(args.sweep)), base))
+    points = expand_sweep(base, spec["sweep"])
+    seeds = replicate_seeds(spec.get("seed", DEFAULT_SEED), spec.get("replicates", 1))
+    jobs = build_jobs(spec["model"], points, seeds)
+
+    cache = ResultCache(args.cache, int(args.cache_mb * 1024 * 1024))
+    results, simulated = collect_runs(jobs, cache, args.workers)
+    print("Simulated", simulated, "of", len(jobs), "runs; the rest came from the cache.")
+
+    stacked_points = [stack_point(spec["model"], params, seeds, results) for params in points]
+    write_results(args.out, sorted(spec["sweep"]), points, stacked_points)
+    print("Results for", len(points), "points written to", args.out)
+
+if __name__ == "__main__":
+    main()
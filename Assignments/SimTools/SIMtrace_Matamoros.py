@@ -0,0 +1,81 @@
+# Simulation Tools - Progress and Trace
+# Computational Epidemiology - Summer II 2020
+# Dr. Johnson
+# Programmer: Corbin Matamoros
+# Program Description:
+#       This module is the one place a simulator reports what it's doing while it runs. A tracer has three
+#       verbosity levels:
+#           SILENT     -> nothing at all
+#           PROGRESS   -> one summary line every `every` days with the day's counts and the throughput
+#                         (days per second and work units, e.g. cells or contacts, per second)
+#           SNAPSHOTS  -> the progress lines, plus every day's full state grid saved to a frame file
+#                         (see `SIMframes_Matamoros.py`) that can be replayed later
+#       Simulators call `begin()` once the population is set up, `day(...)` once per simulated day, and
+#       `snapshot(...)` when `snapshots` is True.
+
+import sys
+import time
+from SIMframes_Matamoros import FrameWriter
+
+SILENT = 0
+PROGRESS = 1
+SNAPSHOTS = 2
+
+class Tracer:
+    # `unit` names the work a simulator reports each day ("cells", "contacts"). `snapshot_path` is the
+    #       frame file used at the SNAPSHOTS level.
+    def __init__(self, level=PROGRESS, every=1, unit="cells", snapshot_path="frames.bin", stream=None):
+        self.level = level
+        self.every = max(1, every)
+        self.unit = unit
+        self.snapshot_path = snapshot_path
+        self.stream = stream or sys.stdout
+        self.snapshots = level >= SNAPSHOTS
+        self.writer = None
+        self.days = 0
+        self.work = 0
+        self.start = time.perf_counter()
+        self.last_time = self.start
+        self.last_days = 0
+        self.last_work = 0
+
+    # mark the end of the setup, so the throughput only counts the simulated days
+    def begin(self):
+        self.start = time.perf_counter()
+        self.last_time = self.start
+
+    # record one finished day. `counts` is a dictionary of the day's counts to show, and `work` is how many
+    #       units of work the day took.
+    def day(self, day, counts, work):
+        self.days += 1
+        self.work += work
+        if self.level >= PROGRESS and self.days % self.every == 0:
+            now = time.perf_counter()
+            elapsed = max(now - self.last_time, 1e-9)
+            days_per_second = (self.days - self.last_days) / elapsed
+            work_per_second = (self.work - self.last_work) / elapsed
+            summary = ' '.join(name+"="+str(value) for name, value in counts.items())
+            self.stream.write("Day "+str(day)+": "+summary+" | "+format(days_per_second, ".3g")+" days/s, "+format(work_per_second, ".3g")+" "+self.unit+"/s\n")
+            self.stream.flush()
+            self.last_time, self.last_days, self.last_work = now, self.days, self.work
+
+    # save one day's state grid (any 2D array of small integers) to the frame file
+    def snapshot(self, frame):
+        if self.writer is None:
+            self.writer = FrameWriter(self.snapshot_path, frame.shape[0], frame.shape[1])
+        self.writer.append(frame)
+
+    # finish the frame file and, unless silent, print a summary of the whole run
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.level >= PROGRESS and self.days:
+            elapsed = max(time.perf_counter() - self.start, 1e-9)
+            self.stream.write("Finished "+str(self.days)+" days in "+format(elapsed, ".3g")+" s ("+format(self.days/elapsed, ".3g")+" days/s, "+format(self.work/elapsed, ".3g")+" "+self.unit+"/s)\n")
+            self.stream.flush()
+
+# build a tracer from the `verbosity`, `progress_every`, and `snapshot_file` params
+def from_params(params, unit, default_level=PROGRESS):
+    return Tracer(params.get("verbosity", default_level), params.get("progress_every", 1), unit,
+                  params.get("snapshot_file", "frames.bin"))